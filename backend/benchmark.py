@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+import train
+from snapshot import snapshot_path_for
+
+# Target time for a fresh worker process to be ready to serve
+COLD_START_TARGET_SECONDS = 0.2
+# Imports main in a fresh interpreter and prints how long that import took
+_COLD_START_SCRIPT = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def generate_agent_data(n_rows, seed=0):
+    """
+    Synthetic agent rows in the train_storming_round.csv schema
+    """
+    rng = np.random.default_rng(seed)
+    # Roughly 17 monthly rows per agent, as in the training data
+    n_agents = max(1, n_rows // 17)
+    agent_codes = np.array([f"{code:08x}" for code in rng.choice(2**32, size=n_agents, replace=False)])
+
+    months = pd.date_range('2019-01-01', '2024-12-01', freq='MS')
+    month_strings = np.array([f"{m.month}/1/{m.year}" for m in months])
+    join = rng.integers(0, 36, size=n_rows)
+    current = np.minimum(join + rng.integers(0, 36, size=n_rows), len(months) - 1)
+    first_sale = np.minimum(join + rng.integers(0, 24, size=n_rows), len(months) - 1)
+
+    def counts(high):
+        return rng.integers(0, high + 1, size=n_rows)
+
+    new_policy_count = np.where(rng.random(n_rows) < 0.1, 0, rng.integers(1, 43, size=n_rows))
+    return pd.DataFrame({
+        'row_id': np.arange(1, n_rows + 1),
+        'agent_code': agent_codes[rng.integers(0, n_agents, size=n_rows)],
+        'agent_age': rng.integers(20, 61, size=n_rows),
+        'agent_join_month': month_strings[join],
+        'first_policy_sold_month': month_strings[first_sale],
+        'year_month': month_strings[current],
+        'unique_proposals_last_7_days': counts(3),
+        'unique_proposals_last_15_days': counts(6),
+        'unique_proposals_last_21_days': counts(20),
+        'unique_proposal': rng.integers(1, 35, size=n_rows),
+        'unique_quotations_last_7_days': counts(4),
+        'unique_quotations_last_15_days': counts(6),
+        'unique_quotations_last_21_days': counts(9),
+        'unique_quotations': rng.integers(1, 33, size=n_rows),
+        'unique_customers_last_7_days': counts(6),
+        'unique_customers_last_15_days': counts(10),
+        'unique_customers_last_21_days': counts(15),
+        'unique_customers': rng.integers(1, 32, size=n_rows),
+        'new_policy_count': new_policy_count,
+        'ANBP_value': new_policy_count * rng.integers(10000, 100000, size=n_rows),
+        'net_income': rng.integers(1000, 1200000, size=n_rows),
+        'number_of_policy_holders': counts(120),
+        'number_of_cash_payment_policies': counts(380)
+    })
+
+
+def timed(timings, name, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[name] = time.perf_counter() - start
+    return result
+
+
+def benchmark_training(data_path):
+    """
+    Wall time of each train.py stage on one input file
+    """
+    timings = {}
+    df = timed(timings, 'load_data', train.load_data, data_path)
+    df = timed(timings, 'feature_enginnering', train.feature_enginnering, df)
+    X_train, y_train, preprocessor = timed(timings, 'preprocess_data', train.preprocess_data, df)
+    model = timed(timings, 'train_model', train.train_model, X_train, y_train, preprocessor)
+
+    performance_df, performance_features = train.clustering_features(df)
+    scaler, kmeans, performance_mapping = timed(timings, 'train_cluster_model', train.train_cluster_model,
+                                                performance_df, performance_features)
+
+    # Time the recommendation step on its own, on already clustered rows
+    clustered = performance_df.copy()
+    clustered['performance_level'] = pd.Series(
+        kmeans.predict(scaler.transform(clustered[performance_features])), index=clustered.index
+    ).map(performance_mapping)
+    timed(timings, 'assign_intervention_strategies', train.assign_intervention_strategies, clustered)
+
+    # End to end clustering prediction, including its own feature pass
+    train.clear_feature_cache()
+    performance_predictions = timed(timings, 'predict_performance', train.predict_performance,
+                                    data_path, scaler, kmeans, performance_mapping)
+    sales_predictions = train.predict_sales(data_path, model)
+    train.clear_feature_cache()
+
+    database = pd.merge(sales_predictions, performance_predictions, on='agent_code', how='left')
+    return timings, database
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def benchmark_serving(client, agent_codes, n_requests, seed=0):
+    """
+    Latency and throughput of the FastAPI endpoints through an in-process client
+    """
+    rng = np.random.default_rng(seed)
+    # One lookup in ten misses, to include the 404 path
+    lookups = [
+        agent_codes[i] if rng.random() >= 0.1 else 'missing-agent'
+        for i in rng.integers(0, len(agent_codes), size=n_requests)
+    ]
+    routes = {
+        '/performance/{agent_id}': [f'/performance/{code}' for code in lookups],
+        '/performance-distribution': ['/performance-distribution'] * n_requests,
+        '/prediction-distribution': ['/prediction-distribution'] * n_requests
+    }
+
+    results = {}
+    for route, urls in routes.items():
+        latencies = []
+        start = time.perf_counter()
+        for url in urls:
+            request_start = time.perf_counter()
+            client.get(url)
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+        results[route] = {
+            'requests': n_requests,
+            'p50_ms': percentile_ms(latencies, 50),
+            'p99_ms': percentile_ms(latencies, 99),
+            'throughput_rps': n_requests / elapsed
+        }
+    return results
+
+
+def benchmark_cold_start(database_path, runs=5):
+    """
+    Time to ready for a fresh worker: a new interpreter importing main against a prebuilt snapshot
+    """
+    env = dict(os.environ, DATABASE_PATH=database_path, SNAPSHOT_PATH=snapshot_path_for(database_path))
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    process_seconds = []
+    import_seconds = []
+    # One extra run first, so bytecode compilation isn't counted
+    for _ in range(runs + 1):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', _COLD_START_SCRIPT], cwd=backend_dir, env=env,
+                                capture_output=True, text=True, check=True)
+        process_seconds.append(time.perf_counter() - start)
+        import_seconds.append(float(result.stdout.strip().splitlines()[-1]))
+
+    process_ms = float(np.median(process_seconds[1:]) * 1000)
+    return {
+        'runs': runs,
+        'process_ms': process_ms,
+        'import_main_ms': float(np.median(import_seconds[1:]) * 1000),
+        'target_ms': COLD_START_TARGET_SECONDS * 1000,
+        'passed': process_ms <= COLD_START_TARGET_SECONDS * 1000
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """
+    Print each measurement as a ratio to the same measurement in a previous results file
+    """
+    with open(baseline_path) as f:
+        baseline = {run['rows']: run for run in json.load(f)['runs']}
+
+    for run in results['runs']:
+        previous = baseline.get(run['rows'])
+        if previous is None:
+            continue
+        print(f"\n{run['rows']} rows (ratio to {baseline_path}, >1 is slower)")
+        for stage, seconds in run['stages'].items():
+            if stage in previous['stages']:
+                print(f"  {stage:32s} {seconds / previous['stages'][stage]:6.2f}x")
+        for route, stats in run['endpoints'].items():
+            if route in previous['endpoints']:
+                print(f"  {route:32s} p99 {stats['p99_ms'] / previous['endpoints'][route]['p99_ms']:6.2f}x")
+        if 'cold_start' in run and 'cold_start' in previous:
+            print(f"  {'cold start':32s} {run['cold_start']['process_ms'] / previous['cold_start']['process_ms']:6.2f}x")
+
+
+def main():
+    """
+    Benchmark the train.py stages and the FastAPI endpoints on synthetic data
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the training and serving hot paths")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help="synthetic dataset sizes to benchmark (e.g. 10000 100000 1000000 10000000)")
+    parser.add_argument('--requests', type=int, default=2000, help="requests per endpoint")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the results")
+    parser.add_argument('--compare', metavar='JSON', default=None, help="previous results file to compare against")
+    args = parser.parse_args()
+
+    # Benchmark the code, not the on-disk feature cache
+    train.FEATURE_CACHE_DIR = ''
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in args.rows:
+            print(f"Benchmarking {n_rows} rows")
+            data_path = os.path.join(tmp_dir, f'agents-{n_rows}.csv')
+            generate_agent_data(n_rows).to_csv(data_path, index=False)
+
+            stages, database = benchmark_training(data_path)
+            for stage, seconds in stages.items():
+                print(f"  {stage:32s} {seconds:8.3f} s")
+
+            database_path = os.path.join(tmp_dir, f'database-{n_rows}.csv')
+            train.write_database(database, database_path)
+
+            # main loads DATABASE_PATH on import, so point it at the synthetic snapshot first
+            os.environ['DATABASE_PATH'] = database_path
+            import main
+            from fastapi.testclient import TestClient
+            main.DATABASE_PATH = database_path
+            main.SNAPSHOT_PATH = snapshot_path_for(database_path)
+            main.snapshot = main.load_snapshot()
+
+            with TestClient(main.app) as client:
+                endpoints = benchmark_serving(client, database['agent_code'].astype(str).tolist(), args.requests)
+            for route, stats in endpoints.items():
+                print(f"  {route:32s} p50 {stats['p50_ms']:7.3f} ms  p99 {stats['p99_ms']:7.3f} ms  "
+                      f"{stats['throughput_rps']:8.0f} req/s")
+
+            cold_start = benchmark_cold_start(database_path)
+            print(f"  {'cold start':32s} {cold_start['process_ms']:7.1f} ms  (import main {cold_start['import_main_ms']:.1f} ms, "
+                  f"target {cold_start['target_ms']:.0f} ms: {'pass' if cold_start['passed'] else 'FAIL'})")
+
+            results['runs'].append({'rows': n_rows, 'stages': stages, 'endpoints': endpoints,
+                                    'cold_start': cold_start})
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+# Entry point
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import struct
+from snapshot import find_key, map_file, write_file
+
+# Read-only binary store of every agent's monthly metrics from the training
+# data, memory-mapped by the backend workers like the snapshot.
+#
+# Layout (little-endian), sharing the snapshot's magic/header/keys prefix:
+#   magic       8 bytes  b'APHIST01'
+#   header_len  uint32
+#   header      JSON: count, key_width, rows, columns, row_format
+#   padding     to a multiple of 8
+#   keys        count * key_width bytes, agent codes sorted, NUL-padded
+#   offsets     (count + 1) * uint64, agent i's rows are offsets[i]:offsets[i + 1]
+#   rows        rows * row_format, sorted by (agent_code, year_month)
+MAGIC = b'APHIST01'
+OFFSET = struct.Struct('<Q')
+
+# Raw monthly metrics kept per row, each as an int64. Each row starts with
+# year_month as a YYYYMM int32; ratios are left to the client.
+HISTORY_COLUMNS = [
+    'new_policy_count', 'ANBP_value', 'net_income', 'unique_proposal', 'unique_quotations',
+    'unique_customers', 'unique_proposals_last_21_days', 'number_of_policy_holders',
+    'number_of_cash_payment_policies'
+]
+
+
+def compile_history(df, history_path):
+    """
+    Compile the monthly rows of an engineered training frame into a history file
+    """
+    # Only compiling needs numpy; the server just maps and reads the file
+    import numpy as np
+
+    row_format = '<i' + 'q' * len(HISTORY_COLUMNS)
+    row_dtype = np.dtype([('year_month', '<i4')] + [(column, '<i8') for column in HISTORY_COLUMNS])
+
+    # Sort by the UTF-8 key bytes, the order the reader binary-searches in
+    keys = np.char.encode(df['agent_code'].astype(str).to_numpy(dtype=str), 'utf-8')
+    months = (df['year_month'].dt.year * 100 + df['year_month'].dt.month).to_numpy(dtype=np.int32)
+    order = np.lexsort((months, keys))
+    keys = keys[order]
+
+    rows = np.empty(len(df), dtype=row_dtype)
+    rows['year_month'] = months[order]
+    for column in HISTORY_COLUMNS:
+        rows[column] = df[column].to_numpy(dtype=np.int64)[order]
+
+    # First row of each agent, plus the end of the last one
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    offsets = np.append(starts, len(keys)).astype('<u8')
+    agent_keys = keys[starts].tolist()
+
+    header = {
+        'count': len(agent_keys),
+        'key_width': max((len(key) for key in agent_keys), default=1),
+        'rows': len(rows),
+        'columns': HISTORY_COLUMNS,
+        'row_format': row_format
+    }
+    return write_file(history_path, MAGIC, header, agent_keys, header['key_width'],
+                      offsets.tobytes(), rows.tobytes())
+
+
+class History:
+    """
+    Read-only, memory-mapped view of a compiled history file.
+
+    An agent's rows are contiguous, so a lookup is a binary search over the
+    keys followed by one sequential read of its k months.
+    """
+
+    def __init__(self, path):
+        self._mm, self.header, self._keys_start = map_file(path, MAGIC)
+        self.count = self.header['count']
+        self.key_width = self.header['key_width']
+        self.columns = self.header['columns']
+        self._row = struct.Struct(self.header['row_format'])
+
+        self._offsets_start = self._keys_start + self.count * self.key_width
+        self._rows_start = self._offsets_start + (self.count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, agent_code):
+        return find_key(self._mm, self._keys_start, self.key_width, self.count, agent_code) >= 0
+
+    def get(self, agent_code, default=None):
+        """
+        An agent's monthly rows in year_month order, or default if unknown
+        """
+        index = find_key(self._mm, self._keys_start, self.key_width, self.count, agent_code)
+        if index < 0:
+            return default
+        start, = OFFSET.unpack_from(self._mm, self._offsets_start + index * OFFSET.size)
+        end, = OFFSET.unpack_from(self._mm, self._offsets_start + (index + 1) * OFFSET.size)
+
+        history = []
+        for values in self._row.iter_unpack(self._mm[self._rows_start + start * self._row.size:
+                                                     self._rows_start + end * self._row.size]):
+            year_month = values[0]
+            row = {'year_month': f"{year_month // 100:04d}-{year_month % 100:02d}"}
+            row.update(zip(self.columns, values[1:]))
+            history.append(row)
+        return history
+
+    def close(self):
+        self._mm.close()
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+# Retrain jobs for the FastAPI service. train.py runs in a child process, so
+# request handling never waits on training CPU work; it publishes
+# database.csv and its snapshot atomically and the backend's watcher swaps
+# them in. Job records live in JOBS_DIR so any worker can report on them.
+#
+# All workers share one queue: JOBS_DIR/queued names the job waiting to
+# start (and the worker that will run it), under JOBS_DIR/queue.lock.
+# JOBS_DIR/retrain.lock is held for a whole run, so one train.py runs at a time.
+JOBS_DIR = os.environ.get('JOBS_DIR', 'jobs')
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The event loop only keeps weak references to tasks, so running jobs are held here
+_tasks = set()
+
+
+def lock_file(f):
+    """
+    Block until this process holds an exclusive lock on the open file f
+    """
+    if os.name == 'nt':
+        import msvcrt
+        # LK_LOCK gives up after 10 seconds, so poll instead
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(0.1)
+    else:
+        import fcntl
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+
+def unlock_file(f):
+    if os.name == 'nt':
+        import msvcrt
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def queue_locked():
+    # Held only while the queue pointer and job records are read and written
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(os.path.join(JOBS_DIR, 'queue.lock'), 'w') as lock:
+        lock_file(lock)
+        try:
+            yield
+        finally:
+            unlock_file(lock)
+
+
+def job_paths(job_id):
+    """
+    (record, progress, log) paths of a job
+    """
+    base = os.path.join(JOBS_DIR, job_id)
+    return f"{base}.json", f"{base}.progress.json", f"{base}.log"
+
+
+def write_job(job):
+    path = job_paths(job['id'])[0]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def read_job(job_id):
+    """
+    A job record with its training progress, or None if there is no such job
+    """
+    # Ids are uuid hex strings; anything else can't name a job file
+    if not job_id.isalnum():
+        return None
+    record_path, progress_path, _ = job_paths(job_id)
+    try:
+        with open(record_path) as f:
+            job = json.load(f)
+    except FileNotFoundError:
+        return None
+    if job['status'] == 'running':
+        job['progress'] = read_progress(progress_path)
+    return job
+
+
+def read_progress(path):
+    # Stages train.py has finished and the one it is in (see profiling.py)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_queued():
+    """
+    The (job, worker pid) waiting to start, or (None, None). Call with the queue lock held.
+    """
+    try:
+        with open(os.path.join(JOBS_DIR, 'queued')) as f:
+            queued = json.load(f)
+    except FileNotFoundError:
+        return None, None
+    job = read_job(queued['id'])
+    if job is None or job['status'] != 'queued':
+        return None, None
+    return job, queued['pid']
+
+
+def write_queued(job):
+    path = os.path.join(JOBS_DIR, 'queued')
+    if job is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({'id': job['id'], 'pid': os.getpid()}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def worker_alive(pid):
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # Access denied means the process exists but belongs to someone else
+            return ctypes.get_last_error() == 5
+        try:
+            exit_code = ctypes.c_ulong()
+            # STILL_ACTIVE until the process exits
+            return not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)) or exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+async def submit_retrain(train_args):
+    """
+    Start a retrain, or coalesce into the job queued behind the current run.
+
+    At most one job runs and one waits across all workers: requests arriving
+    while a job runs all join the same queued job, which starts when the run
+    finishes, so it sees every change made before those requests. Returns
+    (job, coalesced).
+    """
+    # Another worker may hold the queue lock, so wait for it off the event loop
+    job, coalesced = await asyncio.to_thread(_enqueue)
+    if not coalesced:
+        task = asyncio.get_running_loop().create_task(_train(job['id'], train_args))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return job, coalesced
+
+
+def _enqueue():
+    with queue_locked():
+        queued, pid = read_queued()
+        if queued is not None and not worker_alive(pid):
+            # The worker that would have run it is gone, so it never will
+            queued.update(status='failed', finished_at=time.time(), error="worker exited before the job started")
+            write_job(queued)
+            queued = None
+        if queued is not None:
+            queued['requests'] += 1
+            write_job(queued)
+            return queued, True
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'requests': 1,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'returncode': None,
+            'progress': None
+        }
+        write_job(job)
+        write_queued(job)
+        return job, False
+
+
+def _start(job_id):
+    with queue_locked():
+        # Reread the record, which other workers may have joined
+        job = read_job(job_id)
+        if job is None:
+            raise RuntimeError(f"Job record {job_id} disappeared before it started")
+        job.update(status='running', started_at=time.time())
+        write_job(job)
+        # Requests from now on queue a new job, which sees changes made during this run
+        write_queued(None)
+        return job
+
+
+def _abandon(job_id):
+    # A job that failed before it started: take it off the queue so nobody joins it
+    with queue_locked():
+        job = read_job(job_id)
+        if job is not None and read_queued()[0] == job:
+            write_queued(None)
+        return job
+
+
+async def _train(job_id, train_args):
+    _, progress_path, log_path = job_paths(job_id)
+    lock = open(os.path.join(JOBS_DIR, 'retrain.lock'), 'w')
+    job = None
+    process = None
+    try:
+        # Waits for the running job, from this worker or another, to finish
+        await asyncio.to_thread(lock_file, lock)
+        job = await asyncio.to_thread(_start, job_id)
+
+        with open(log_path, 'wb') as log:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, 'train.py', *train_args, cwd=BACKEND_DIR,
+                env=dict(os.environ, TRAIN_PROGRESS=os.path.abspath(progress_path)),
+                stdout=log, stderr=asyncio.subprocess.STDOUT
+            )
+            returncode = await process.wait()
+        job.update(status='succeeded' if returncode == 0 else 'failed', returncode=returncode)
+    except BaseException as exc:
+        # Includes cancellation at server shutdown: don't leave train.py running
+        # with nothing to report on it
+        if process is not None and process.returncode is None:
+            process.terminate()
+            await process.wait()
+        if job is None:
+            job = await asyncio.to_thread(_abandon, job_id)
+        if job is not None:
+            job.update(status='failed', returncode=process.returncode if process is not None else None,
+                       error=str(exc) or type(exc).__name__)
+        if not isinstance(exc, Exception):
+            raise
+    finally:
+        # Closing the file releases the lock
+        lock.close()
+        if job is not None:
+            job.update(finished_at=time.time(), progress=read_progress(progress_path))
+            write_job(job)
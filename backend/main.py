@@ -1,15 +1,134 @@
-from fastapi import FastAPI, HTTPException
+import time
+# Startup is measured from here to the end of the lifespan startup
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-from collections import Counter
-import uvicorn
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List
+from contextlib import asynccontextmanager
+import os
+import threading
+import jobs
+import metrics
+from snapshot import BodyStore, Snapshot, compile_snapshot, file_version, snapshot_path_for, to_json_bytes
+from history import History
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'database.csv')
+# Compiled, memory-mapped form of database.csv shared by all workers
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', snapshot_path_for(DATABASE_PATH))
+# Per-agent monthly history written by train.py
+HISTORY_PATH = os.environ.get('HISTORY_PATH', 'history.snapshot')
+# Intervention progress compiled by progress.py
+PROGRESS_PATH = os.environ.get('PROGRESS_PATH', 'progress.snapshot')
+# How often the background watcher checks database.csv and the progress store for a new version
+RELOAD_INTERVAL_SECONDS = float(os.environ.get('RELOAD_INTERVAL_SECONDS', '2'))
+# Number of NDJSON lines written per chunk of a streamed batch response
+BATCH_LINES_PER_CHUNK = 256
+
+
+def progress_version():
+    return file_version(PROGRESS_PATH) if os.path.exists(PROGRESS_PATH) else None
+
+
+def source_version():
+    # The snapshot tracks database.csv; deployments may also ship the snapshot alone
+    if os.path.exists(DATABASE_PATH):
+        database_version = file_version(DATABASE_PATH)
+    else:
+        database_version = file_version(SNAPSHOT_PATH)
+    # progress.py updates its store independently of train.py
+    return [database_version, progress_version()]
+
+
+def load_snapshot(path=None):
+    """
+    Map the compiled snapshot, compiling it first if database.csv is newer
+    """
+    load_start = time.perf_counter()
+    if path is None:
+        path = SNAPSHOT_PATH
+
+    # train.py compiles the snapshot when it publishes database.csv; compile
+    # here only if it is missing or was built from another version
+    reader = None
+    if os.path.exists(path):
+        reader = Snapshot(path)
+    if os.path.exists(DATABASE_PATH) and (reader is None or reader.header['source'] != file_version(DATABASE_PATH)):
+        compile_snapshot(DATABASE_PATH, path)
+        reader = Snapshot(path)
+    if reader is None:
+        raise FileNotFoundError(f"Neither {DATABASE_PATH} nor {path} exists")
+
+    # train.py writes the history before database.csv, so it is current here too
+    history = History(HISTORY_PATH) if os.path.exists(HISTORY_PATH) else None
+    # Versioned before mapping, so a store replaced in between is picked up next time
+    progress_source = progress_version()
+    progress = BodyStore(PROGRESS_PATH) if progress_source is not None else None
+
+    return {
+        'version': [reader.header['source'] if os.path.exists(DATABASE_PATH) else file_version(path),
+                    progress_source],
+        'data_by_id': reader,
+        'history': history,
+        'progress': progress,
+        'performance_distribution': reader.header['performance_distribution'],
+        'prediction_distribution': reader.header['prediction_distribution'],
+        'load_seconds': time.perf_counter() - load_start,
+        'loaded_at': time.time(),
+    }
+
+
+# The current snapshot. Requests read this reference once and the reloader
+# replaces it with a single assignment, so a request always sees one
+# consistent version of the data.
+snapshot = load_snapshot()
+# Snapshots swapped in by the reloader (only the watcher thread writes this)
+snapshot_reloads = 0
+# Seconds from importing this module to being ready to serve, set by lifespan
+startup_seconds = None
+
+
+def reload_snapshot_if_changed():
+    """
+    Swap in a new snapshot if database.csv or the progress store changed since the last load
+    """
+    global snapshot, snapshot_reloads
+    try:
+        if source_version() == snapshot['version']:
+            return False
+    except FileNotFoundError:
+        return False
+    try:
+        new_snapshot = load_snapshot()
+    except Exception as exc:
+        # Keep serving the previous snapshot until a readable file arrives
+        print(f"Snapshot reload failed, keeping current data: {exc}")
+        return False
+    snapshot = new_snapshot
+    snapshot_reloads += 1
+    return True
+
+
+def watch_snapshot(stop_event):
+    while not stop_event.wait(RELOAD_INTERVAL_SECONDS):
+        reload_snapshot_if_changed()
 
-# Load data
-df = pd.read_csv('database.csv')
-df = df.drop_duplicates(subset='agent_code', keep='first')
-data_by_id = df.set_index('agent_code').to_dict(orient='index')
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    global startup_seconds
+    # Reload database.csv in the background whenever train.py publishes a new one
+    stop_event = threading.Event()
+    watcher = threading.Thread(target=watch_snapshot, args=(stop_event,), daemon=True)
+    watcher.start()
+    startup_seconds = time.perf_counter() - _import_started
+    yield
+    stop_event.set()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ✅ Add CORS middleware
 app.add_middleware(
@@ -20,36 +139,126 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics, outermost so they include the time spent in CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+# The lookup handlers are async: they never block, and running on the event
+# loop keeps every metrics update on one thread
 @app.get("/performance/{agent_id}")
-def get_performance(agent_id: str):
-    if agent_id in data_by_id:
-        return {
-            "agent_code": agent_id,
-            "prediction": data_by_id[agent_id]['prediction'],
-            "performance_level": data_by_id[agent_id]['performance_level'],
-            "recommendations": eval(data_by_id[agent_id]['recommendations'])
-        }
+async def get_performance(agent_id: str):
+    body = snapshot['data_by_id'].get(agent_id)
+    if body is not None:
+        metrics.agent_lookups['snapshot', 'hit'] += 1
+        return Response(content=body, media_type="application/json")
+    metrics.agent_lookups['snapshot', 'miss'] += 1
     raise HTTPException(status_code=404, detail="Agent not found")
 
+@app.get("/performance/{agent_id}/history")
+async def get_performance_history(agent_id: str):
+    history = snapshot['history']
+    if history is None:
+        raise HTTPException(status_code=400, detail="History data is missing")
+
+    # Binary search for the agent, then its months are read contiguously
+    rows = history.get(agent_id)
+    if rows is None:
+        metrics.agent_lookups['history', 'miss'] += 1
+        raise HTTPException(status_code=404, detail="Agent not found")
+    metrics.agent_lookups['history', 'hit'] += 1
+    return Response(content=to_json_bytes({"agent_code": agent_id, "history": rows}), media_type="application/json")
+
+@app.get("/progress/{agent_id}")
+async def get_progress(agent_id: str):
+    progress = snapshot['progress']
+    if progress is None:
+        raise HTTPException(status_code=400, detail="Progress data is missing")
+
+    # The agent's interventions, pre-serialized when progress.py compiled the store
+    body = progress.get(agent_id)
+    if body is None:
+        metrics.agent_lookups['progress', 'miss'] += 1
+        raise HTTPException(status_code=404, detail="Agent not found")
+    metrics.agent_lookups['progress', 'hit'] += 1
+    return Response(content=body, media_type="application/json")
+
+class BatchRequest(BaseModel):
+    agent_codes: List[str]
+
+
+async def stream_batch(data_by_id, agent_codes):
+    # Emit one JSON document per line, a few hundred lines per chunk, so
+    # the full response is never held in memory
+    lines = []
+    for agent_code in agent_codes:
+        body = data_by_id.get(agent_code)
+        if body is None:
+            metrics.agent_lookups['snapshot', 'miss'] += 1
+            body = to_json_bytes({"agent_code": agent_code, "status": 404, "detail": "Agent not found"})
+        else:
+            metrics.agent_lookups['snapshot', 'hit'] += 1
+        lines.append(body)
+        if len(lines) == BATCH_LINES_PER_CHUNK:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+@app.post("/performance/batch")
+async def get_performance_batch(request: BatchRequest):
+    # Pin the current snapshot so a reload mid-stream can't mix versions
+    data_by_id = snapshot['data_by_id']
+    return StreamingResponse(stream_batch(data_by_id, request.agent_codes), media_type="application/x-ndjson")
+
 @app.get("/performance-distribution")
 def get_performance_distribution():
-    if 'performance_level' not in df.columns:
+    performance_distribution = snapshot['performance_distribution']
+    if performance_distribution is None:
         raise HTTPException(status_code=400, detail="Performance level data is missing")
 
-    # Get the distribution of performance levels
-    performance_counts = Counter(df['performance_level'])
-    return {"performance_distribution": dict(performance_counts)}
+    # Distribution of performance levels, precomputed when the snapshot was compiled
+    return {"performance_distribution": performance_distribution}
 
 @app.get("/prediction-distribution")
 def get_prediction_distribution():
-    if 'prediction' not in df.columns:
+    prediction_distribution = snapshot['prediction_distribution']
+    if prediction_distribution is None:
         raise HTTPException(status_code=400, detail="Prediction data is missing")
-    
-    # Get the distribution of predictions (1 or 0)
-    prediction_counts = Counter(df['prediction'])
-    return {"prediction_distribution": dict(prediction_counts)}
+
+    # Distribution of predictions (1 or 0), precomputed when the snapshot was compiled
+    return {"prediction_distribution": prediction_distribution}
+
+@app.get("/progress-distribution")
+def get_progress_distribution():
+    progress = snapshot['progress']
+    if progress is None:
+        raise HTTPException(status_code=400, detail="Progress data is missing")
+
+    # Interventions by improvement status, precomputed when the store was compiled
+    return {"improvement_status_distribution": progress.header['improvement_status_distribution']}
+
+@app.post("/jobs/retrain", status_code=202)
+async def post_retrain():
+    # train.py runs in a child process and publishes to the paths served here
+    job, coalesced = await jobs.submit_retrain(['--output', os.path.abspath(DATABASE_PATH),
+                                                '--history', os.path.abspath(HISTORY_PATH)])
+    return {**job, "coalesced": coalesced}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.read_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format. Async so it renders on the event
+    # loop, the thread every metrics update happens on
+    return PlainTextResponse(metrics.render(snapshot, snapshot_reloads, startup_seconds), media_type="text/plain; version=0.0.4")
 
 
 # Entry point
 if __name__ == "__main__":
+    # Only needed when run directly; workers started by uvicorn already have it
+    import uvicorn
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -0,0 +1,119 @@
+import time
+from bisect import bisect_left
+
+# Request metrics for the FastAPI service, exposed in Prometheus text format.
+# Every update and the /metrics render run on the event loop thread (the
+# middleware, the async handlers and get_metrics), so the counters need no
+# lock. render also copies each dict before iterating, so it stays safe if it
+# is ever called from another thread while a new label is added.
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# (method, route) -> [bucket counts..., +Inf count, sum of durations]
+_latency = {}
+# (method, route, status) -> count
+_requests = {}
+# (store, 'hit' / 'miss') -> count, for each store agent codes are looked up in
+agent_lookups = {(store, result): 0 for store in ('snapshot', 'history', 'progress') for result in ('hit', 'miss')}
+
+
+def observe(method, route, status, duration):
+    key = (method, route)
+    histogram = _latency.get(key)
+    if histogram is None:
+        histogram = _latency[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+    histogram[bisect_left(LATENCY_BUCKETS, duration)] += 1
+    histogram[-1] += duration
+
+    key = (method, route, status)
+    _requests[key] = _requests.get(key, 0) + 1
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and status counts
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; label by its
+            # template so agent codes don't each become a time series
+            route = scope.get('route')
+            observe(scope['method'], route.path if route is not None else 'unmatched', status,
+                    time.perf_counter() - start)
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render(snapshot, reloads, startup_seconds=None):
+    """
+    All metrics in Prometheus text exposition format
+    """
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by route.',
+        '# TYPE http_request_duration_seconds histogram'
+    ]
+    for (method, route), histogram in sorted(dict(_latency).items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram[:-1]):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{_labels(method=method, route=route, le=bound)}}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{{{_labels(method=method, route=route)}}} {histogram[-1]}')
+        lines.append(f'http_request_duration_seconds_count{{{_labels(method=method, route=route)}}} {cumulative}')
+
+    lines += [
+        '# HELP http_requests_total Requests by route and status code.',
+        '# TYPE http_requests_total counter'
+    ]
+    for (method, route, status), count in sorted(dict(_requests).items()):
+        lines.append(f'http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}')
+
+    lines += [
+        '# HELP agent_lookups_total Agent code lookups by store and result.',
+        '# TYPE agent_lookups_total counter'
+    ]
+    for (store, result), count in dict(agent_lookups).items():
+        lines.append(f'agent_lookups_total{{{_labels(store=store, result=result)}}} {count}')
+
+    lines += [
+        '# HELP snapshot_load_seconds Time taken to load the current snapshot.',
+        '# TYPE snapshot_load_seconds gauge',
+        f"snapshot_load_seconds {snapshot['load_seconds']}",
+        '# HELP snapshot_loaded_timestamp_seconds Unix time the current snapshot was loaded.',
+        '# TYPE snapshot_loaded_timestamp_seconds gauge',
+        f"snapshot_loaded_timestamp_seconds {snapshot['loaded_at']}",
+        '# HELP snapshot_agents Agents in the current snapshot.',
+        '# TYPE snapshot_agents gauge',
+        f"snapshot_agents {len(snapshot['data_by_id'])}",
+        '# HELP snapshot_reloads_total Snapshots swapped in since startup.',
+        '# TYPE snapshot_reloads_total counter',
+        f'snapshot_reloads_total {reloads}'
+    ]
+    if startup_seconds is not None:
+        lines += [
+            '# HELP startup_seconds Time from importing the app to being ready to serve.',
+            '# TYPE startup_seconds gauge',
+            f'startup_seconds {startup_seconds}'
+        ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,149 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Stage instrumentation for the train.py pipeline. Off by default; turn it on
+# with TRAIN_PROFILE=<report.json> (add TRAIN_CPROFILE=1 for a cProfile dump of
+# the slowest stage) or train.py --profile <report.json> [--cprofile].
+_report_path = os.environ.get('TRAIN_PROFILE') or None
+_cprofile = os.environ.get('TRAIN_CPROFILE', '') not in ('', '0')
+# Progress file rewritten as top-level stages start and finish, for callers
+# running train.py as a job (TRAIN_PROGRESS=<progress.json>)
+_progress_path = os.environ.get('TRAIN_PROGRESS') or None
+
+_records = []
+_profiles = {}
+_depth = 0
+_started = time.perf_counter()
+_completed = []
+
+
+def enable(report_path=None, cprofile=False):
+    # A None report path keeps the one from TRAIN_PROFILE
+    global _report_path, _cprofile
+    _report_path = report_path or _report_path
+    _cprofile = _cprofile or cprofile
+
+
+def is_enabled():
+    return _report_path is not None or _progress_path is not None
+
+
+def _write_progress(current):
+    progress = {'stage': current, 'completed': _completed, 'elapsed_s': time.perf_counter() - _started}
+    tmp_path = f"{_progress_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, _progress_path)
+
+
+def process_peak_rss_mb():
+    try:
+        # POSIX only, so imported here to keep train.py importable on Windows
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Record wall time, CPU time, the process's peak RSS so far and rows for a block of the pipeline.
+
+    Yields a dict; set its 'rows' key inside the block when the row count is
+    only known afterwards. Does nothing when instrumentation is off.
+    """
+    global _depth
+    record = {'stage': name, 'rows': rows}
+    if not is_enabled():
+        yield record
+        return
+
+    record['depth'] = _depth
+    top_level = _depth == 0
+    if top_level and _progress_path is not None:
+        _write_progress(name)
+    # cProfile can't nest, so only top-level stages are profiled
+    profiler = cProfile.Profile() if _cprofile and _report_path is not None and top_level else None
+    _depth += 1
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _depth -= 1
+        record['wall_s'] = time.perf_counter() - wall_start
+        record['cpu_s'] = time.process_time() - cpu_start
+        # ru_maxrss is the process high-water mark, not the stage's own peak:
+        # a stage only shows memory use if it raised the mark
+        record['process_peak_rss_mb'] = process_peak_rss_mb()
+        _records.append(record)
+        if profiler is not None:
+            _profiles[len(_records) - 1] = profiler
+        if top_level and _progress_path is not None:
+            _completed.append(name)
+            _write_progress(None)
+
+
+def _row_count(args, result):
+    for value in (result, *args):
+        if isinstance(value, tuple) and value:
+            value = value[0]
+        if hasattr(value, 'shape'):
+            return int(value.shape[0])
+    return None
+
+
+def staged(name):
+    """
+    Decorator form of stage(); rows come from the first frame returned or passed in
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+            with stage(name) as record:
+                result = fn(*args, **kwargs)
+                record['rows'] = _row_count(args, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def write_report():
+    """
+    Write the JSON run report, plus a cProfile dump of the slowest top-level stage
+    """
+    if _report_path is None:
+        return None
+
+    top_level = [i for i, record in enumerate(_records) if record['depth'] == 0]
+    slowest = max(top_level, key=lambda i: _records[i]['wall_s'], default=None)
+    report = {
+        'total_wall_s': time.perf_counter() - _started,
+        'process_peak_rss_mb': process_peak_rss_mb(),
+        'slowest_stage': _records[slowest]['stage'] if slowest is not None else None,
+        'profile': None,
+        'stages': _records
+    }
+
+    if slowest in _profiles:
+        profile_path = os.path.splitext(_report_path)[0] + '.prof'
+        _profiles[slowest].dump_stats(profile_path)
+        report['profile'] = profile_path
+
+    with open(_report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return _report_path
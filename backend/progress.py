@@ -0,0 +1,240 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import train
+from snapshot import BodyStore, compile_body_store, to_json_bytes
+
+# Intervention progress tracking, as set up in the "Monitor and Improve
+# Existing Agent Performance" notebook: one row per (agent_code,
+# performance_level) with baselines, targets, checkpoint observations and an
+# improvement_status. The tracker CSV is the state; progress.snapshot is the
+# compiled form the backend serves.
+
+# Metrics tracked through an intervention
+TRACKING_METRICS = [
+    'new_policy_count',
+    'ANBP_value',
+    'net_income',
+    'overall_conversion_rate',
+    'unique_proposals_last_21_days',
+    'unique_customers'
+]
+
+# Improvement target over the baseline for each performance level
+TARGET_MULTIPLIERS = {'Low': 1.3, 'Medium': 1.2, 'High': 1.1}
+
+# Checkpoints in order, with their days after the intervention start
+CHECKPOINTS = {'first_checkpoint': 30, 'second_checkpoint': 60, 'final_evaluation': 90}
+
+# Local working copy, rewritten in place by init and checkpoint. Point
+# PROGRESS_TRACKER_PATH at the notebook's CSV to work on that one instead.
+TRACKER_PATH = os.environ.get('PROGRESS_TRACKER_PATH', 'progress_tracker.csv')
+PROGRESS_PATH = os.environ.get('PROGRESS_PATH', 'progress.snapshot')
+
+
+def tracker_columns():
+    # Same column order as the notebook's agent_progress_tracker.csv
+    return (
+        ['agent_code', 'performance_level']
+        + [f'{metric}_baseline' for metric in TRACKING_METRICS]
+        + [f'{metric}_target' for metric in TRACKING_METRICS]
+        + ['intervention_start_date'] + list(CHECKPOINTS)
+        + [f'{metric}_{checkpoint}' for checkpoint in CHECKPOINTS for metric in TRACKING_METRICS]
+        + ['improvement_status']
+    )
+
+
+def build_tracker(performance_df, start_date=None):
+    """
+    Baselines and targets per (agent_code, performance_level) from clustered rows
+    """
+    metrics = performance_df[TRACKING_METRICS].astype(np.float64)
+    keys = [performance_df['agent_code'].astype(str).rename('agent_code'),
+            performance_df['performance_level'].astype(str).rename('performance_level')]
+    tracker = metrics.groupby(keys).mean().add_suffix('_baseline').reset_index()
+
+    multiplier = tracker['performance_level'].map(TARGET_MULTIPLIERS).to_numpy(dtype=np.float64)
+    for metric in TRACKING_METRICS:
+        tracker[f'{metric}_target'] = tracker[f'{metric}_baseline'].to_numpy() * multiplier
+
+    start = pd.Timestamp(start_date) if start_date is not None else pd.Timestamp.now()
+    tracker['intervention_start_date'] = start.strftime('%Y-%m-%d')
+    for checkpoint, days in CHECKPOINTS.items():
+        tracker[checkpoint] = (start + pd.Timedelta(days=days)).strftime('%Y-%m-%d')
+        for metric in TRACKING_METRICS:
+            tracker[f'{metric}_{checkpoint}'] = np.nan
+
+    tracker['improvement_status'] = 'Pending'
+    return tracker[tracker_columns()]
+
+
+def update_status(tracker, rows=None):
+    """
+    Recompute improvement_status from each row's latest observed checkpoint.
+
+    rows is a boolean mask of the rows to update (default all). A row is
+    Pending until a checkpoint is recorded, then Target Met if every metric
+    reached its target, Improving if at least half are above baseline, and
+    Not Improving otherwise.
+    """
+    if rows is None:
+        rows = np.ones(len(tracker), dtype=bool)
+    subset = tracker.loc[rows]
+
+    # Later checkpoints overwrite earlier ones where they have been recorded
+    latest = np.full((len(subset), len(TRACKING_METRICS)), np.nan)
+    for checkpoint in CHECKPOINTS:
+        values = subset[[f'{metric}_{checkpoint}' for metric in TRACKING_METRICS]].to_numpy(dtype=np.float64)
+        recorded = ~np.isnan(values).all(axis=1)
+        latest[recorded] = values[recorded]
+
+    baselines = subset[[f'{metric}_baseline' for metric in TRACKING_METRICS]].to_numpy(dtype=np.float64)
+    targets = subset[[f'{metric}_target' for metric in TRACKING_METRICS]].to_numpy(dtype=np.float64)
+    met = (latest >= targets).sum(axis=1)
+    improved = (latest > baselines).sum(axis=1)
+
+    tracker.loc[rows, 'improvement_status'] = np.select(
+        [np.isnan(latest).all(axis=1), met == len(TRACKING_METRICS), 2 * improved >= len(TRACKING_METRICS)],
+        ['Pending', 'Target Met', 'Improving'],
+        'Not Improving'
+    )
+    return tracker
+
+
+def record_checkpoint(tracker, checkpoint, observations):
+    """
+    Fold one checkpoint's observed rows into the tracker in place.
+
+    Observations are averaged per agent and written to every tracker row of
+    that agent; only those rows have their status recomputed. Returns the
+    agent codes that were updated.
+    """
+    if checkpoint not in CHECKPOINTS:
+        raise ValueError(f"Unknown checkpoint {checkpoint!r}, expected one of {list(CHECKPOINTS)}")
+
+    observed = observations[TRACKING_METRICS].astype(np.float64).groupby(
+        observations['agent_code'].astype(str).rename('agent_code')).mean()
+    rows = tracker['agent_code'].isin(observed.index).to_numpy()
+
+    columns = [f'{metric}_{checkpoint}' for metric in TRACKING_METRICS]
+    tracker.loc[rows, columns] = observed.loc[tracker.loc[rows, 'agent_code'], TRACKING_METRICS].to_numpy()
+    update_status(tracker, rows)
+    return tracker.loc[rows, 'agent_code'].unique().tolist()
+
+
+def read_tracker(path=None):
+    # Agent codes are hex strings that can look numeric, so keep them as text.
+    # round_trip parses floats exactly as to_csv wrote them, so a body compiled
+    # from a reread tracker matches one compiled before the write.
+    return pd.read_csv(path or TRACKER_PATH, dtype={'agent_code': str}, float_precision='round_trip')
+
+
+def write_tracker(tracker, path=None):
+    path = path or TRACKER_PATH
+    tmp_path = f"{path}.tmp"
+    tracker.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def agent_bodies(tracker, agent_codes=None):
+    """
+    The /progress/{agent_id} JSON body of each agent (or only of agent_codes)
+    """
+    if agent_codes is not None:
+        tracker = tracker[tracker['agent_code'].isin(agent_codes)]
+
+    grouped = {}
+    for row in tracker.to_dict('records'):
+        # Unrecorded checkpoints are NaN in the frame and null in JSON
+        row = {name: None if isinstance(value, float) and np.isnan(value) else value for name, value in row.items()}
+        grouped.setdefault(row['agent_code'], []).append(row)
+    return {code: to_json_bytes({'agent_code': code, 'interventions': rows}) for code, rows in grouped.items()}
+
+
+def compile_progress(tracker, path=None, changed=None):
+    """
+    Compile the tracker into the store the backend serves.
+
+    With changed (agent codes), bodies of every other agent are copied from
+    the existing store instead of being serialized again. The whole store is
+    still rewritten; only the JSON encoding of unchanged agents is skipped.
+    """
+    path = path or PROGRESS_PATH
+    previous = BodyStore(path) if changed is not None and os.path.exists(path) else None
+    try:
+        if previous is None:
+            bodies = agent_bodies(tracker)
+        else:
+            codes = tracker['agent_code'].unique().tolist()
+            stale = set(changed) | {code for code in codes if code not in previous}
+            bodies = agent_bodies(tracker, stale)
+            for code in codes:
+                if code not in bodies:
+                    bodies[code] = bytes(previous.get(code))
+
+        status_counts = tracker['improvement_status'].value_counts()
+        header = {
+            'metrics': TRACKING_METRICS,
+            'improvement_status_distribution': {status: int(count) for status, count in status_counts.items()}
+        }
+        return compile_body_store(path, header, bodies)
+    finally:
+        if previous is not None:
+            previous.close()
+
+
+def clustered_rows(data_path, artifacts):
+    """
+    Clustering features of a CSV with the performance level of each row
+    """
+    performance_df, performance_features = train.prepare_data_for_clustering(data_path)
+    performance_df = performance_df.copy()
+    clusters = artifacts['kmeans'].predict(artifacts['scaler'].transform(performance_df[performance_features]))
+    performance_df['performance_level'] = pd.Series(clusters, index=performance_df.index).map(
+        artifacts['performance_mapping'])
+    return performance_df
+
+
+def main():
+    """
+    Start, update and compile the agent progress tracker
+    """
+    parser = argparse.ArgumentParser(description="Track agent progress through interventions")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init = commands.add_parser('init', help="start a tracker from the latest clustering of the training data")
+    init.add_argument('--data', default='../datasets/train_storming_round.csv', help="agent CSV for the baselines")
+    init.add_argument('--start-date', default=None, help="intervention start date (defaults to today)")
+
+    checkpoint = commands.add_parser('checkpoint', help="record a monthly agent file as a checkpoint")
+    checkpoint.add_argument('checkpoint', choices=list(CHECKPOINTS))
+    checkpoint.add_argument('data_path', help="CSV in the test_storming_round.csv format")
+
+    compile_ = commands.add_parser('compile', help="recompile the served store from a tracker CSV")
+    compile_.add_argument('tracker_path', nargs='?', default=None, help=f"defaults to {TRACKER_PATH}")
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        artifacts = train.load_artifacts()
+        tracker = build_tracker(clustered_rows(args.data, artifacts), args.start_date)
+        write_tracker(tracker)
+        compile_progress(tracker)
+        print(f"Tracking {len(tracker)} interventions for {tracker['agent_code'].nunique()} agents "
+              f"with model version {artifacts['version']}")
+    elif args.command == 'checkpoint':
+        tracker = read_tracker()
+        observations, _ = train.prepare_data_for_clustering(args.data_path)
+        changed = record_checkpoint(tracker, args.checkpoint, observations)
+        write_tracker(tracker)
+        compile_progress(tracker, changed=changed)
+        print(f"Recorded {args.checkpoint} for {len(changed)} agents")
+    else:
+        tracker = read_tracker(args.tracker_path)
+        compile_progress(tracker)
+        print(f"Compiled {len(tracker)} interventions to {PROGRESS_PATH}")
+
+
+# Entry point
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+from train import load_artifacts, model_thresholds, score, score_streaming, write_database
+
+
+def main():
+    """
+    Score a monthly agent file with saved model artifacts, without retraining
+    """
+    parser = argparse.ArgumentParser(description="Score a monthly agent file with saved model artifacts")
+    parser.add_argument('data_path', help="CSV in the test_storming_round.csv format")
+    parser.add_argument('--artifact', default=None, help="artifact file to use (defaults to artifacts/LATEST)")
+    parser.add_argument('--output', default='database.csv', help="where to write the predictions")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="stream the file in chunks of this many rows (for files larger than memory)")
+    parser.add_argument('--thresholds', choices=['batch', 'model'], default='batch',
+                        help="intervention thresholds from this file's quantiles (default) or saved with the model")
+    parser.add_argument('--approximate', action='store_true',
+                        help="with --chunksize and batch thresholds, estimate them with constant-memory sketches")
+    args = parser.parse_args()
+
+    artifacts = load_artifacts(args.artifact)
+    print(f"Scoring {args.data_path} with model version {artifacts['version']}")
+    # Model thresholds score every batch against the same cut-offs, and spare
+    # streamed scoring its first pass
+    thresholds = model_thresholds(artifacts) if args.thresholds == 'model' else None
+
+    # Predict and publish
+    if args.chunksize:
+        rows = score_streaming(args.data_path, artifacts, args.output, args.chunksize, thresholds, args.approximate)
+    else:
+        predictions = score(args.data_path, artifacts, thresholds)
+        write_database(predictions, args.output)
+        rows = len(predictions)
+    print(f"Wrote {rows} predictions to {args.output}")
+
+
+# Entry point
+if __name__ == "__main__":
+    main()
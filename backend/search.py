@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import KMeans
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import get_scorer, silhouette_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+import profiling
+import train
+from profiling import stage
+
+# Forest configurations to evaluate, expanded with ParameterGrid. Each
+# parameter lists its cheaper value first (fewer trees, shallower trees,
+# bigger leaves, fewer features per split), so ties keep the cheaper value.
+FOREST_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [16, None],
+    'min_samples_leaf': [4, 1],
+    'max_features': ['sqrt', 0.5]
+}
+# K values to evaluate for the performance clustering; only reported, since
+# rank_clusters needs K=3
+CLUSTER_COUNTS = [2, 3, 4, 5, 6, 7, 8]
+# Rows sampled for the silhouette score, which is quadratic in the rows scored
+SILHOUETTE_SAMPLE = 10000
+
+# Read-only arrays mapped by each search worker, set by _init_search_worker
+_shared = {}
+
+
+def _init_search_worker(array_paths):
+    # Every worker maps the same .npy files, so the data is in memory once
+    for name, path in array_paths.items():
+        _shared[name] = np.load(path, mmap_mode='r')
+    # Parallelism comes from the process pool, so each task uses one core
+    _shared['thread_limits'] = threadpool_limits(1)
+
+
+def _evaluate_forest(task):
+    params, fold, scoring = task
+    X, y, folds = _shared['X'], _shared['y'], _shared['folds']
+    train_rows = folds != fold
+
+    start = time.perf_counter()
+    model = RandomForestClassifier(random_state=42, n_jobs=1, **params)
+    model.fit(X[train_rows], y[train_rows])
+    score = get_scorer(scoring)(model, X[~train_rows], y[~train_rows])
+    return float(score), time.perf_counter() - start
+
+
+def _evaluate_clusters(n_clusters):
+    X = _shared['clustering']
+
+    start = time.perf_counter()
+    # Same estimator as train_cluster_model
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(X)
+    silhouette = silhouette_score(X, kmeans.labels_, sample_size=min(SILHOUETTE_SAMPLE, len(X)), random_state=42)
+    return float(silhouette), float(kmeans.inertia_), time.perf_counter() - start
+
+
+def save_arrays(directory, **arrays):
+    paths = {}
+    for name, array in arrays.items():
+        paths[name] = os.path.join(directory, f'{name}.npy')
+        np.save(paths[name], np.ascontiguousarray(array))
+    return paths
+
+
+def search(data_path, scoring='f1', n_folds=3, n_jobs=None):
+    """
+    Evaluate every forest configuration and cluster count in one process pool.
+
+    The preprocessor and the clustering scaler are fitted once; the
+    transformed matrices are shared read-only with the workers. Returns
+    (forest results, cluster results), each sorted best first.
+    """
+    n_workers = joblib.effective_n_jobs(train.N_JOBS if n_jobs is None else n_jobs)
+
+    with stage('search_prepare'):
+        X_train, y_train, preprocessor = train.prepare_train_data(data_path)
+        X = preprocessor.fit_transform(X_train, y_train)
+        if sparse.issparse(X):
+            X = X.toarray()
+        y = y_train.to_numpy()
+        # Fold of each row; the workers rebuild each split from this
+        folds = np.empty(len(y), dtype=np.int8)
+        for fold, (_, test_rows) in enumerate(StratifiedKFold(n_folds, shuffle=True, random_state=42).split(X, y)):
+            folds[test_rows] = fold
+
+        performance_df, performance_features = train.prepare_data_for_clustering(data_path)
+        clustering = StandardScaler().fit_transform(performance_df[performance_features])
+
+    configs = list(ParameterGrid(FOREST_GRID))
+    with tempfile.TemporaryDirectory() as tmp_dir, stage('search_evaluate'):
+        array_paths = save_arrays(tmp_dir, X=X, y=y, folds=folds, clustering=clustering)
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_search_worker,
+                                 initargs=(array_paths,)) as executor:
+            # Submit the slow forest fits first so the cluster fits fill the gaps
+            forest_futures = [
+                [executor.submit(_evaluate_forest, (params, fold, scoring)) for fold in range(n_folds)]
+                for params in configs
+            ]
+            cluster_futures = [executor.submit(_evaluate_clusters, k) for k in CLUSTER_COUNTS]
+
+            forest_results = []
+            for params, futures in zip(configs, forest_futures):
+                scores, seconds = zip(*(future.result() for future in futures))
+                forest_results.append({'params': params, 'score': float(np.mean(scores)),
+                                       'score_std': float(np.std(scores)), 'fit_seconds': float(sum(seconds))})
+            cluster_results = []
+            for n_clusters, future in zip(CLUSTER_COUNTS, cluster_futures):
+                silhouette, inertia, seconds = future.result()
+                cluster_results.append({'n_clusters': n_clusters, 'silhouette': silhouette,
+                                        'inertia': inertia, 'fit_seconds': seconds})
+
+    # Stable sort: ties keep grid order, so the configuration with the cheaper values wins
+    forest_results.sort(key=lambda result: result['score'], reverse=True)
+    cluster_results.sort(key=lambda result: result['silhouette'], reverse=True)
+    return forest_results, cluster_results
+
+
+def print_table(forest_results, cluster_results, scoring):
+    rows = []
+    for i, result in enumerate(forest_results):
+        rows.append(('forest', ', '.join(f'{name}={value}' for name, value in result['params'].items()),
+                     f"{scoring} {result['score']:.4f} ± {result['score_std']:.4f}", result['fit_seconds'], i == 0))
+    for i, result in enumerate(cluster_results):
+        rows.append(('kmeans', f"n_clusters={result['n_clusters']}, inertia={result['inertia']:.4g}",
+                     f"silhouette {result['silhouette']:.4f}", result['fit_seconds'], i == 0))
+
+    # The best of each model is starred
+    width = max(len(row[1]) for row in rows)
+    print(f"{'model':8s} {'parameters':{width}s} {'score':>22s} {'fit s':>8s}")
+    for model, params, score, seconds, best in rows:
+        print(f"{model:8s} {params:{width}s} {score:>22s} {seconds:8.2f}{'  *' if best else ''}")
+
+
+def main():
+    """
+    Search forest configurations and cluster counts, then save the best forest as the latest artifact.
+
+    The cluster counts are only reported: the performance levels need K=3,
+    so the saved clustering always uses three clusters.
+    """
+    parser = argparse.ArgumentParser(description="Search forest configurations and cluster counts in parallel")
+    parser.add_argument('--data', default='../datasets/train_storming_round.csv', help="training CSV")
+    parser.add_argument('--scoring', default='f1', help="scikit-learn scorer for the forest (default f1)")
+    parser.add_argument('--folds', type=int, default=3, help="cross-validation folds per forest configuration")
+    parser.add_argument('--output', default=train.SEARCH_RESULTS_PATH,
+                        help="where to write every result; train.py trains with the best forest from here")
+    parser.add_argument('--no-save', action='store_true', help="only report, don't save the best forest")
+    args = parser.parse_args()
+
+    forest_results, cluster_results = search(args.data, args.scoring, args.folds)
+    print_table(forest_results, cluster_results, args.scoring)
+
+    best_params = forest_results[0]['params']
+    # Advisory: train.py keeps K=3, which the High/Medium/Low ranking needs
+    results = {'data': args.data, 'scoring': args.scoring, 'folds': args.folds,
+               'best_forest_params': best_params, 'best_silhouette_n_clusters': cluster_results[0]['n_clusters'],
+               'forest': forest_results, 'clusters': cluster_results, 'artifact': None}
+
+    if not args.no_save:
+        # Refit the best forest on all the training rows (the features come from the cache)
+        X_train, y_train, preprocessor = train.prepare_train_data(args.data)
+        model = train.train_model(X_train, y_train, preprocessor, params=best_params)
+        performance_df, performance_features = train.prepare_data_for_clustering(args.data)
+        scaler, kmeans, performance_mapping = train.train_cluster_model(performance_df, performance_features)
+        results['artifact'] = train.save_artifacts(model, scaler, kmeans, performance_mapping,
+                                                   thresholds=train.compute_intervention_thresholds(performance_df))
+        print(f"Saved model artifacts to {results['artifact']}; run score.py to publish new predictions")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+    profiling.write_report()
+
+
+# Entry point
+if __name__ == "__main__":
+    main()
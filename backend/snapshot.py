@@ -0,0 +1,307 @@
+import ast
+import csv
+import json
+import mmap
+import os
+import struct
+from collections import Counter
+
+# Read-only binary snapshot of database.csv, memory-mapped by every backend
+# worker so they share one copy of the data through the page cache.
+#
+# Layout (little-endian):
+#   magic       8 bytes  b'APSNAP01'
+#   header_len  uint32
+#   header      JSON: count, key_width, source, levels, recommendation_texts,
+#               performance_distribution, prediction_distribution
+#   padding     to a multiple of 8
+#   keys        count * key_width bytes, agent codes sorted, NUL-padded
+#   records     count * RECORD, same order as keys
+#   bodies      pre-serialized /performance/{agent_id} JSON bodies
+MAGIC = b'APSNAP01'
+# body offset, body length, prediction (-1 = missing), level index
+# (255 = missing), up to 8 recommendation codes (255 = unused)
+RECORD = struct.Struct('<QIbB8s2x')
+MAX_RECOMMENDATIONS = 8
+MISSING = 255
+
+# Generic store of pre-serialized JSON bodies by agent code: the shared
+# magic/header/keys prefix, then count * BODY_RECORD (body offset, length),
+# then the bodies
+BODY_STORE_MAGIC = b'APBODY01'
+BODY_RECORD = struct.Struct('<QI4x')
+
+
+def snapshot_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.snapshot'
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def to_json_bytes(content):
+    # Same encoding FastAPI's JSONResponse uses, so pre-serialized bodies are byte-identical
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def write_file(path, magic, header, keys, key_width, *blocks):
+    """
+    Atomically write a file in the shared layout: magic, header, padding, keys, then blocks
+    """
+    header = to_json_bytes(header)
+    padding = -(len(magic) + 4 + len(header)) % 8
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(magic)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * padding)
+        for key in keys:
+            f.write(key.ljust(key_width, b'\0'))
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp_path, path)
+    return path
+
+
+def map_file(path, magic):
+    """
+    Memory-map a file in the shared layout, returning (mmap, header, offset of the key block)
+    """
+    with open(path, 'rb') as f:
+        # The mapping stays valid after the file is closed or replaced
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(magic)] != magic:
+        mm.close()
+        raise ValueError(f"{path} is not a {magic.decode()} file")
+
+    header_len, = struct.unpack_from('<I', mm, len(magic))
+    header_start = len(magic) + 4
+    header = json.loads(mm[header_start:header_start + header_len])
+    keys_start = header_start + header_len
+    return mm, header, keys_start + (-keys_start % 8)
+
+
+def find_key(mm, keys_start, key_width, count, agent_code):
+    """
+    Binary-search a sorted block of NUL-padded keys in place; the index of agent_code or -1
+    """
+    key = agent_code.encode('utf-8')
+    if len(key) > key_width:
+        return -1
+    key = key.ljust(key_width, b'\0')
+
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = keys_start + mid * key_width
+        probe = mm[offset:offset + key_width]
+        if probe < key:
+            lo = mid + 1
+        elif probe > key:
+            hi = mid
+        else:
+            return mid
+    return -1
+
+
+def _distribution(counts):
+    # JSON object keys are strings, which is also how FastAPI serializes them
+    return {str(k) if k is not None else 'null': v for k, v in counts.items()}
+
+
+def compile_snapshot(csv_path, snapshot_path=None):
+    """
+    Compile database.csv into a snapshot file and atomically publish it
+    """
+    if snapshot_path is None:
+        snapshot_path = snapshot_path_for(csv_path)
+    # Record the source version before reading, so a write racing with the
+    # read leaves the snapshot looking stale rather than current
+    source = file_version(csv_path)
+
+    levels = []
+    recommendation_texts = []
+    code_by_text = {}
+    codes_by_raw = {}
+    agents = {}
+    performance_counts = Counter()
+    prediction_counts = Counter()
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        # A missing column leaves its distribution out (None), which the backend reports as a 400
+        has_prediction = 'prediction' in (reader.fieldnames or [])
+        has_performance_level = 'performance_level' in (reader.fieldnames or [])
+        for row in reader:
+            # Keep the first row per agent
+            agent_code = row['agent_code']
+            if agent_code in agents:
+                continue
+
+            prediction = int(float(row['prediction'])) if has_prediction and row['prediction'] else None
+            performance_level = (row['performance_level'] or None) if has_performance_level else None
+            performance_counts[performance_level] += 1
+            prediction_counts[prediction] += 1
+
+            raw = row['recommendations']
+            codes = codes_by_raw.get(raw)
+            if codes is None:
+                # Most agents share the same list, so each distinct literal is parsed once
+                texts = ast.literal_eval(raw) if raw else []
+                for text in texts:
+                    if text not in code_by_text:
+                        code_by_text[text] = len(recommendation_texts)
+                        recommendation_texts.append(text)
+                codes = bytes(code_by_text[text] for text in texts)
+                codes_by_raw[raw] = codes
+            if performance_level is not None and performance_level not in levels:
+                levels.append(performance_level)
+            agents[agent_code] = (prediction, performance_level, codes)
+
+    if len(recommendation_texts) >= MISSING or len(levels) >= MISSING:
+        raise ValueError(f"{csv_path} has too many distinct recommendations or levels for a snapshot")
+
+    keys = sorted(code.encode('utf-8') for code in agents)
+    key_width = max((len(key) for key in keys), default=1)
+
+    header = {
+        'count': len(keys),
+        'key_width': key_width,
+        'source': source,
+        'levels': levels,
+        'recommendation_texts': recommendation_texts,
+        'performance_distribution': _distribution(performance_counts) if has_performance_level else None,
+        'prediction_distribution': _distribution(prediction_counts) if has_prediction else None
+    }
+
+    records = bytearray()
+    bodies = bytearray()
+    for key in keys:
+        agent_code = key.decode('utf-8')
+        prediction, performance_level, codes = agents[agent_code]
+        if len(codes) > MAX_RECOMMENDATIONS:
+            raise ValueError(f"Agent {agent_code} has more than {MAX_RECOMMENDATIONS} recommendations")
+        body = to_json_bytes({
+            "agent_code": agent_code,
+            "prediction": prediction,
+            "performance_level": performance_level,
+            "recommendations": [recommendation_texts[code] for code in codes]
+        })
+        records += RECORD.pack(
+            len(bodies), len(body),
+            -1 if prediction is None else prediction,
+            MISSING if performance_level is None else levels.index(performance_level),
+            codes.ljust(MAX_RECOMMENDATIONS, bytes([MISSING]))
+        )
+        bodies += body
+
+    return write_file(snapshot_path, MAGIC, header, keys, key_width, records, bodies)
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a compiled snapshot.
+
+    Lookups binary-search the sorted key block in place, so opening the file
+    costs only the header parse and all workers share the mapped pages.
+    """
+
+    def __init__(self, path):
+        self._mm, self.header, self._keys_start = map_file(path, MAGIC)
+        self.count = self.header['count']
+        self.key_width = self.header['key_width']
+        self.levels = self.header['levels']
+        self.recommendation_texts = self.header['recommendation_texts']
+
+        self._records_start = self._keys_start + self.count * self.key_width
+        self._bodies_start = self._records_start + self.count * RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, agent_code):
+        return find_key(self._mm, self._keys_start, self.key_width, self.count, agent_code)
+
+    def __contains__(self, agent_code):
+        return self._index(agent_code) >= 0
+
+    def get(self, agent_code, default=None):
+        """
+        The pre-serialized JSON body for an agent, or default if unknown
+        """
+        index = self._index(agent_code)
+        if index < 0:
+            return default
+        offset, length = RECORD.unpack_from(self._mm, self._records_start + index * RECORD.size)[:2]
+        start = self._bodies_start + offset
+        return self._mm[start:start + length]
+
+    def record(self, agent_code):
+        """
+        (prediction, performance_level, recommendation codes) for an agent, or None
+        """
+        index = self._index(agent_code)
+        if index < 0:
+            return None
+        _, _, prediction, level, codes = RECORD.unpack_from(self._mm, self._records_start + index * RECORD.size)
+        return (
+            None if prediction < 0 else prediction,
+            None if level == MISSING else self.levels[level],
+            tuple(code for code in codes if code != MISSING)
+        )
+
+    def close(self):
+        self._mm.close()
+
+
+def compile_body_store(path, header, bodies):
+    """
+    Write a body store from a dict of agent code -> JSON body bytes
+    """
+    keys = sorted(code.encode('utf-8') for code in bodies)
+    key_width = max((len(key) for key in keys), default=1)
+
+    records = bytearray()
+    blob = bytearray()
+    for key in keys:
+        body = bodies[key.decode('utf-8')]
+        records += BODY_RECORD.pack(len(blob), len(body))
+        blob += body
+
+    header = dict(header, count=len(keys), key_width=key_width)
+    return write_file(path, BODY_STORE_MAGIC, header, keys, key_width, records, blob)
+
+
+class BodyStore:
+    """
+    Read-only, memory-mapped map from agent code to a pre-serialized JSON body
+    """
+
+    def __init__(self, path):
+        self._mm, self.header, self._keys_start = map_file(path, BODY_STORE_MAGIC)
+        self.count = self.header['count']
+        self.key_width = self.header['key_width']
+        self._records_start = self._keys_start + self.count * self.key_width
+        self._bodies_start = self._records_start + self.count * BODY_RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, agent_code):
+        return find_key(self._mm, self._keys_start, self.key_width, self.count, agent_code) >= 0
+
+    def get(self, agent_code, default=None):
+        index = find_key(self._mm, self._keys_start, self.key_width, self.count, agent_code)
+        if index < 0:
+            return default
+        offset, length = BODY_RECORD.unpack_from(self._mm, self._records_start + index * BODY_RECORD.size)
+        start = self._bodies_start + offset
+        return self._mm[start:start + length]
+
+    def close(self):
+        self._mm.close()
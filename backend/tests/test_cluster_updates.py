@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import pandas as pd
+import train
+
+import pytest
+
+FEATURES = ['unique_proposals_last_21_days', 'activity_rate_21days', 'ANBP_value', 'new_policy_count',
+            'quotation_to_policy_rate', 'avg_policy_value', 'overall_conversion_rate', 'net_income',
+            'profit_per_policy', 'proposal_to_quotation_rate', 'unique_customers']
+
+
+def blobs(n_per_cluster, seed):
+    # Three well separated groups of agents, scoring 1, 5 and 9 on every feature
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([rng.normal(level, 0.3, size=(n_per_cluster, len(FEATURES))) for level in (1, 5, 9)])
+    return pd.DataFrame(values, columns=FEATURES)
+
+
+@pytest.fixture
+def fitted():
+    df = blobs(200, seed=0)
+    scaler, kmeans, mapping = train.train_cluster_model(df, FEATURES)
+    return df, scaler, kmeans, mapping
+
+
+def test_update_is_a_running_mean(fitted):
+    df, scaler, kmeans, mapping = fitted
+    counts = np.bincount(kmeans.labels_, minlength=3)
+    new_rows = blobs(50, seed=1)
+
+    new_scaler, new_kmeans, new_mapping, new_counts = train.update_cluster_model(
+        new_rows, FEATURES, scaler, kmeans, counts)
+
+    # Each centroid is the mean of every row ever assigned to it
+    everything = pd.concat([df, new_rows], ignore_index=True)
+    labels = np.r_[kmeans.labels_, new_kmeans.labels_]
+    centers = new_scaler.inverse_transform(new_kmeans.cluster_centers_)
+    for cluster in range(3):
+        assert centers[cluster] == pytest.approx(everything[labels == cluster].mean().to_numpy())
+    assert new_counts.tolist() == np.bincount(labels, minlength=3).tolist()
+    # The scaler now reflects all the rows
+    assert new_scaler.mean_ == pytest.approx(everything.mean().to_numpy())
+    assert new_scaler.n_samples_seen_ == len(everything)
+
+    # Well separated groups keep their levels, and the inputs are untouched
+    assert new_mapping == mapping
+    assert sorted(mapping.values()) == ['High', 'Low', 'Medium']
+    assert counts.tolist() == np.bincount(kmeans.labels_, minlength=3).tolist()
+    assert scaler.n_samples_seen_ == len(df)
+
+
+def test_saved_counts_warm_start(fitted, tmp_path):
+    _, scaler, kmeans, mapping = fitted
+    path = train.save_artifacts(None, scaler, kmeans, mapping, artifact_dir=str(tmp_path))
+    artifacts = train.load_artifacts(path)
+    assert artifacts['format_version'] == train.ARTIFACT_FORMAT_VERSION
+    assert artifacts['cluster_counts'].tolist() == np.bincount(kmeans.labels_, minlength=3).tolist()
+
+
+def test_old_artifact_format_is_rejected(fitted, tmp_path, monkeypatch):
+    _, scaler, kmeans, mapping = fitted
+    monkeypatch.setattr(train, 'ARTIFACT_FORMAT_VERSION', train.ARTIFACT_FORMAT_VERSION - 1)
+    path = train.save_artifacts(None, scaler, kmeans, mapping, artifact_dir=str(tmp_path))
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='has artifact format'):
+        train.load_artifacts(path)
+
+
+def test_other_sklearn_version_is_rejected(fitted, tmp_path, monkeypatch):
+    _, scaler, kmeans, mapping = fitted
+    monkeypatch.setattr(train.sklearn, '__version__', '0.0.1')
+    path = train.save_artifacts(None, scaler, kmeans, mapping, artifact_dir=str(tmp_path))
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='saved with scikit-learn 0.0.1'):
+        train.load_artifacts(path)
+
+
+def test_old_artifacts_are_pruned(fitted, tmp_path, monkeypatch):
+    _, scaler, kmeans, mapping = fitted
+    monkeypatch.setattr(train, 'ARTIFACT_KEEP', 2)
+    paths = [train.save_artifacts(None, scaler, kmeans, mapping, artifact_dir=str(tmp_path)) for _ in range(4)]
+    remaining = sorted(name for name in os.listdir(tmp_path) if name.endswith('.joblib'))
+    assert remaining == sorted(os.path.basename(path) for path in paths[-2:])
+    assert train.load_artifacts(artifact_dir=str(tmp_path))['version'] in paths[-1]
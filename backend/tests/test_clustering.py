@@ -0,0 +1,39 @@
+import json
+import numpy as np
+import pandas as pd
+import train
+
+import pytest
+
+
+def centers(n_clusters):
+    # Cluster i scores i on every weighted feature, so the last cluster ranks best
+    columns = ['unique_proposals_last_21_days', 'activity_rate_21days', 'ANBP_value', 'new_policy_count',
+               'quotation_to_policy_rate', 'avg_policy_value', 'overall_conversion_rate', 'net_income',
+               'profit_per_policy', 'proposal_to_quotation_rate', 'unique_customers']
+    return pd.DataFrame(np.repeat(np.arange(n_clusters, dtype=float)[:, None], len(columns), axis=1),
+                        columns=columns)
+
+
+def test_rank_clusters():
+    assert train.rank_clusters(centers(3)) == {0: 'Low', 1: 'Medium', 2: 'High'}
+
+
+@pytest.mark.parametrize('n_clusters', [2, 4])
+def test_rank_clusters_needs_three(n_clusters):
+    with pytest.raises(ValueError, match=f"Can't rank {n_clusters} clusters"):
+        train.rank_clusters(centers(n_clusters))
+
+
+def test_train_cluster_model_needs_three():
+    with pytest.raises(ValueError, match='n_clusters=4'):
+        train.train_cluster_model(centers(8), list(centers(8).columns), n_clusters=4)
+
+
+def test_load_search_results(tmp_path):
+    path = tmp_path / 'search_results.json'
+    assert train.load_search_results(str(path)) == {}
+
+    params = {'max_depth': 16, 'max_features': 'sqrt', 'min_samples_leaf': 4, 'n_estimators': 100}
+    path.write_text(json.dumps({'best_forest_params': params, 'best_silhouette_n_clusters': 5}))
+    assert train.load_search_results(str(path)) == params
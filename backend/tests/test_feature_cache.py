@@ -0,0 +1,35 @@
+import os
+import pandas as pd
+import train
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'datasets')
+
+
+def test_cached_features_round_trip(tmp_path):
+    data_path = os.path.join(DATASETS, 'test_storming_round.csv')
+    cache_dir = str(tmp_path / 'cache')
+    train.clear_feature_cache()
+    df, performance_df, _ = train.build_features(data_path, cache_dir)
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(path) for path in
+                                                    train.feature_cache_paths(data_path, cache_dir))
+
+    # A new process would read the Feather files instead of the CSV
+    train.clear_feature_cache()
+    cached_df, cached_performance_df, _ = train.build_features(data_path, cache_dir)
+    pd.testing.assert_frame_equal(cached_df, df)
+    pd.testing.assert_frame_equal(cached_performance_df, performance_df)
+    train.clear_feature_cache()
+
+
+def test_prune_keeps_most_recently_used(tmp_path):
+    for i in range(4):
+        for kind in ('features', 'performance'):
+            path = tmp_path / f'{kind}-{i}.feather'
+            path.write_bytes(b'')
+            os.utime(path, (i, i))
+    # Entry 0 was read most recently
+    os.utime(tmp_path / 'features-0.feather', (10, 10))
+
+    train.prune_feature_cache(str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == ['features-0.feather', 'features-3.feather',
+                                            'performance-0.feather', 'performance-3.feather']
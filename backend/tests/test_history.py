@@ -0,0 +1,49 @@
+import pandas as pd
+import metrics
+from history import HISTORY_COLUMNS, History, compile_history
+
+
+def monthly_rows():
+    rows = [('b2', '2024-02-01'), ('a1', '2024-03-01'), ('b2', '2024-01-01'), ('a1', '2024-01-01'),
+            ('ü3', '2023-12-01')]
+    df = pd.DataFrame(rows, columns=['agent_code', 'year_month'])
+    df['year_month'] = pd.to_datetime(df['year_month'])
+    for i, column in enumerate(HISTORY_COLUMNS):
+        df[column] = range(i * 10, i * 10 + len(df))
+    return df
+
+
+def test_history_lookups(tmp_path):
+    df = monthly_rows()
+    history = History(compile_history(df, str(tmp_path / 'history.snapshot')))
+    try:
+        assert len(history) == 3
+        assert 'a1' in history and 'zz' not in history
+
+        rows = history.get('b2')
+        # Months come back in order, whatever the input order
+        assert [row['year_month'] for row in rows] == ['2024-01', '2024-02']
+        assert rows[0]['ANBP_value'] == df.loc[2, 'ANBP_value']
+        assert [row['net_income'] for row in history.get('a1')] == [df.loc[3, 'net_income'], df.loc[1, 'net_income']]
+        assert history.get('ü3')[0]['year_month'] == '2023-12'
+        assert history.get('zz', []) == []
+    finally:
+        history.close()
+
+
+def test_empty_history(tmp_path):
+    history = History(compile_history(monthly_rows().iloc[:0], str(tmp_path / 'history.snapshot')))
+    try:
+        assert len(history) == 0
+        assert history.get('a1') is None
+    finally:
+        history.close()
+
+
+def test_lookups_labelled_by_store(monkeypatch):
+    monkeypatch.setitem(metrics.agent_lookups, ('history', 'miss'), 2)
+    snapshot = {'load_seconds': 0.1, 'loaded_at': 0, 'data_by_id': {}}
+    text = metrics.render(snapshot, 0)
+    assert 'agent_lookups_total{store="history",result="miss"} 2' in text
+    assert 'agent_lookups_total{store="snapshot",result="hit"}' in text
+    assert 'agent_lookups_total{store="progress",result="hit"}' in text
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import sys
+import jobs
+
+import pytest
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    # A stand-in train.py: sleeps for argv[1] seconds, then exits with argv[2]
+    (tmp_path / 'train.py').write_text(
+        "import sys, time\n"
+        "time.sleep(float(sys.argv[1]))\n"
+        "sys.exit(int(sys.argv[2]))\n"
+    )
+    monkeypatch.setattr(jobs, 'BACKEND_DIR', str(tmp_path))
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path / 'jobs'))
+    return tmp_path
+
+
+async def wait_for_jobs():
+    while jobs._tasks:
+        await asyncio.sleep(0.05)
+
+
+async def wait_until_running(job):
+    while jobs.read_job(job['id'])['status'] != 'running':
+        await asyncio.sleep(0.05)
+
+
+def test_requests_coalesce_behind_the_running_job(backend):
+    async def run():
+        first, first_coalesced = await jobs.submit_retrain(['0.5', '0'])
+        # Until it starts, the first job is the queued one and requests join it
+        await wait_until_running(first)
+        queued = [await jobs.submit_retrain(['0.5', '0']) for _ in range(3)]
+        await wait_for_jobs()
+        return first, first_coalesced, queued
+
+    first, first_coalesced, queued = asyncio.run(run())
+    assert not first_coalesced
+    assert [coalesced for _, coalesced in queued] == [False, True, True]
+    assert len({job['id'] for job, _ in queued}) == 1
+
+    first = jobs.read_job(first['id'])
+    second = jobs.read_job(queued[0][0]['id'])
+    assert (first['status'], first['requests'], first['returncode']) == ('succeeded', 1, 0)
+    assert (second['status'], second['requests']) == ('succeeded', 3)
+    # The queued job only starts once the running one has finished
+    assert second['started_at'] >= first['finished_at']
+    assert not os.path.exists(os.path.join(jobs.JOBS_DIR, 'queued'))
+
+
+def test_failed_train(backend):
+    async def run():
+        job, _ = await jobs.submit_retrain(['0', '3'])
+        await wait_for_jobs()
+        return job
+
+    job = jobs.read_job(asyncio.run(run())['id'])
+    assert (job['status'], job['returncode']) == ('failed', 3)
+    assert job['finished_at'] is not None
+
+
+def test_cancelled_job_stops_train(backend):
+    async def run():
+        job, _ = await jobs.submit_retrain(['30', '0'])
+        await wait_until_running(job)
+        await asyncio.sleep(0.2)
+        task, = jobs._tasks
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return job
+
+    job = jobs.read_job(asyncio.run(run())['id'])
+    assert job['status'] == 'failed'
+    assert job['error'] == 'CancelledError'
+    # Terminated, not left running as an orphan
+    assert job['returncode'] is not None and job['returncode'] != 0
+
+
+def test_queued_job_of_an_exited_worker_is_not_joined(backend):
+    dead = {'id': 'a' * 32, 'status': 'queued', 'requests': 1}
+    os.makedirs(jobs.JOBS_DIR)
+    jobs.write_job(dead)
+    with open(os.path.join(jobs.JOBS_DIR, 'queued'), 'w') as f:
+        # A pid that can't belong to a live process
+        json.dump({'id': dead['id'], 'pid': 2 ** 22 + 1}, f)
+
+    async def run():
+        job = await jobs.submit_retrain(['0', '0'])
+        await wait_for_jobs()
+        return job
+
+    job, coalesced = asyncio.run(run())
+    assert not coalesced
+    assert jobs.read_job(dead['id'])['status'] == 'failed'
+    assert jobs.read_job(job['id'])['status'] == 'succeeded'
+
+
+def test_read_job_rejects_paths(backend):
+    assert jobs.read_job('../secret') is None
+    assert jobs.read_job('f' * 32) is None
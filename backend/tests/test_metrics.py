@@ -0,0 +1,18 @@
+import metrics
+
+
+def test_render_histogram(monkeypatch):
+    monkeypatch.setattr(metrics, '_latency', {})
+    monkeypatch.setattr(metrics, '_requests', {})
+    metrics.observe('GET', '/performance/{agent_id}', 200, 0.0007)
+    metrics.observe('GET', '/performance/{agent_id}', 404, 3.0)
+
+    text = metrics.render({'load_seconds': 0.1, 'loaded_at': 0, 'data_by_id': {}}, 1, startup_seconds=0.05)
+    labels = 'method="GET",route="/performance/{agent_id}"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.0005"}} 0' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.001"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in text
+    assert f'http_requests_total{{{labels},status="404"}} 1' in text
+    assert 'snapshot_reloads_total 1' in text
+    assert 'startup_seconds 0.05' in text
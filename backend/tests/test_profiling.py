@@ -0,0 +1,32 @@
+import json
+import profiling
+
+
+def test_stage_report(tmp_path, monkeypatch):
+    report_path = str(tmp_path / 'report.json')
+    monkeypatch.setattr(profiling, '_records', [])
+    monkeypatch.setattr(profiling, '_profiles', {})
+    monkeypatch.setattr(profiling, '_report_path', None)
+    monkeypatch.setattr(profiling, '_cprofile', False)
+    profiling.enable(report_path, cprofile=True)
+
+    with profiling.stage('outer', rows=3):
+        with profiling.stage('inner') as record:
+            record['rows'] = 2
+    profiling.write_report()
+
+    with open(report_path) as f:
+        report = json.load(f)
+    assert [(stage['stage'], stage['depth'], stage['rows']) for stage in report['stages']] == \
+        [('inner', 1, 2), ('outer', 0, 3)]
+    assert report['slowest_stage'] == 'outer'
+    # ru_maxrss is a process-wide high-water mark, and is named as one
+    assert all(stage['process_peak_rss_mb'] > 0 for stage in report['stages'])
+    assert report['profile'] is not None
+
+
+def test_enable_keeps_env_report_path(monkeypatch):
+    monkeypatch.setattr(profiling, '_report_path', 'from_env.json')
+    monkeypatch.setattr(profiling, '_cprofile', False)
+    profiling.enable(None, cprofile=True)
+    assert (profiling._report_path, profiling._cprofile) == ('from_env.json', True)
@@ -0,0 +1,88 @@
+import filecmp
+import json
+import numpy as np
+import pandas as pd
+import progress
+from snapshot import BodyStore
+
+import pytest
+
+
+def performance_rows(codes, levels, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(1, 100, size=(len(codes), len(progress.TRACKING_METRICS))) / 3,
+                      columns=progress.TRACKING_METRICS)
+    df.insert(0, 'agent_code', codes)
+    df['performance_level'] = levels
+    return df
+
+
+@pytest.fixture
+def tracker():
+    rows = performance_rows(['a1', 'a1', 'b2', 'c3', '0e1'], ['Low', 'Low', 'Medium', 'High', 'Low'])
+    return progress.build_tracker(rows, '2024-01-01')
+
+
+def test_build_tracker(tracker):
+    assert list(tracker.columns) == progress.tracker_columns()
+    assert tracker['agent_code'].tolist() == ['0e1', 'a1', 'b2', 'c3']
+    low = tracker.set_index('agent_code').loc['a1']
+    assert low['ANBP_value_target'] == pytest.approx(1.3 * low['ANBP_value_baseline'])
+    assert low['second_checkpoint'] == '2024-03-01'
+    assert (tracker['improvement_status'] == 'Pending').all()
+
+
+def test_update_status(tracker):
+    baselines = tracker[[f'{metric}_baseline' for metric in progress.TRACKING_METRICS]].to_numpy()
+    targets = tracker[[f'{metric}_target' for metric in progress.TRACKING_METRICS]].to_numpy()
+    first = [f'{metric}_first_checkpoint' for metric in progress.TRACKING_METRICS]
+    second = [f'{metric}_second_checkpoint' for metric in progress.TRACKING_METRICS]
+
+    # 0e1 meets every target; a1 improves half its metrics; b2 falls back; c3 has nothing recorded
+    tracker.loc[0, first] = targets[0]
+    tracker.loc[1, first] = np.r_[baselines[1, :3] + 1, baselines[1, 3:] - 1]
+    tracker.loc[2, first] = targets[2]
+    # The later checkpoint wins
+    tracker.loc[2, second] = baselines[2] - 1
+    progress.update_status(tracker)
+    assert tracker['improvement_status'].tolist() == ['Target Met', 'Improving', 'Not Improving', 'Pending']
+
+
+def test_record_checkpoint(tracker):
+    observations = performance_rows(['b2', 'b2', 'zz'], 'Low', seed=1)
+    changed = progress.record_checkpoint(tracker, 'first_checkpoint', observations)
+
+    assert changed == ['b2']
+    row = tracker.set_index('agent_code').loc['b2']
+    assert row['net_income_first_checkpoint'] == pytest.approx(observations['net_income'][:2].mean())
+    assert tracker.set_index('agent_code')['ANBP_value_first_checkpoint'].drop('b2').isna().all()
+    assert row['improvement_status'] != 'Pending'
+
+    with pytest.raises(ValueError, match='Unknown checkpoint'):
+        progress.record_checkpoint(tracker, 'third_checkpoint', observations)
+
+
+def test_incremental_compile_matches_full(tracker, tmp_path):
+    tracker_path, store_path = str(tmp_path / 'tracker.csv'), str(tmp_path / 'progress.snapshot')
+    progress.write_tracker(tracker, tracker_path)
+    progress.compile_progress(tracker, store_path)
+
+    # As the checkpoint command does: reread, record, write, then recompile the changed agents
+    tracker = progress.read_tracker(tracker_path)
+    changed = progress.record_checkpoint(tracker, 'first_checkpoint', performance_rows(['a1'], 'Low', seed=2))
+    progress.write_tracker(tracker, tracker_path)
+    progress.compile_progress(tracker, store_path, changed=changed)
+
+    full_path = str(tmp_path / 'full.snapshot')
+    progress.compile_progress(progress.read_tracker(tracker_path), full_path)
+    assert filecmp.cmp(store_path, full_path, shallow=False)
+
+    store = BodyStore(store_path)
+    try:
+        assert len(store) == 4
+        assert store.header['improvement_status_distribution']['Pending'] == 3
+        body = json.loads(bytes(store.get('0e1')))
+        assert body['agent_code'] == '0e1'
+        assert body['interventions'][0]['ANBP_value_first_checkpoint'] is None
+    finally:
+        store.close()
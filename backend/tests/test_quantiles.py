@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import train
+from quantiles import ExactQuantiles, KLLSketch
+
+import pytest
+
+QUANTILES = [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+
+
+def rank_error(values, estimate, q):
+    # Distance between the estimate's rank and the requested rank, as a fraction of n
+    values = np.sort(values)
+    low = np.searchsorted(values, estimate, side='left')
+    high = np.searchsorted(values, estimate, side='right')
+    target = q * (len(values) - 1)
+    return max(0, low - target, target - high) / len(values)
+
+
+def test_exact_quantiles_match_series():
+    values = np.random.default_rng(1).normal(size=5000)
+    values[::97] = np.nan
+    summary = ExactQuantiles()
+    for chunk in np.array_split(values, 7):
+        summary.update(chunk)
+
+    assert len(summary) == np.count_nonzero(~np.isnan(values))
+    for q in QUANTILES:
+        assert summary.quantile(q) == pytest.approx(pd.Series(values).quantile(q))
+
+
+def test_empty_summaries():
+    assert np.isnan(ExactQuantiles().quantile(0.5))
+    assert np.isnan(KLLSketch().quantile(0.5))
+
+
+def test_kll_exact_before_compaction():
+    values = np.random.default_rng(2).uniform(size=100)
+    sketch = KLLSketch(k=200).update(values)
+    for q in QUANTILES:
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q))
+
+
+def test_kll_rank_error():
+    values = np.random.default_rng(3).lognormal(size=200000)
+    sketch = KLLSketch()
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+
+    assert len(sketch) == len(values)
+    for q in QUANTILES[1:-1]:
+        assert rank_error(values, sketch.quantile(q), q) < 0.01
+
+
+def test_kll_merge():
+    values = np.random.default_rng(4).exponential(size=120000)
+    parts = [KLLSketch(seed=seed).update(chunk) for seed, chunk in enumerate(np.array_split(values, 6))]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+
+    assert len(merged) == len(values)
+    for q in QUANTILES[1:-1]:
+        assert rank_error(values, merged.quantile(q), q) < 0.01
+
+
+def test_kll_merge_rejects_other_k():
+    with pytest.raises(ValueError, match='k=200 and k=100'):
+        KLLSketch(200).merge(KLLSketch(100))
+
+
+def intervention_frame(n=3000, seed=5):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: rng.gamma(2.0, size=n) for column, _ in train.INTERVENTION_QUANTILES.values()})
+    df.iloc[::50, 0] = np.nan
+    return df
+
+
+def test_intervention_thresholds_match_series_quantile():
+    df = intervention_frame()
+    thresholds = train.compute_intervention_thresholds(df)
+    assert set(thresholds) == set(train.INTERVENTION_QUANTILES)
+    for name, (column, q) in train.INTERVENTION_QUANTILES.items():
+        assert thresholds[name] == pytest.approx(df[column].quantile(q))
+
+
+def test_merged_intervention_thresholds_match_whole_frame():
+    df = intervention_frame()
+    parts = [train.threshold_summaries(df.iloc[start:start + 750]) for start in range(0, len(df), 750)]
+    merged = train.thresholds_from_summaries(train.merge_threshold_summaries(parts))
+    assert merged == pytest.approx(train.compute_intervention_thresholds(df))
+
+
+def test_approximate_intervention_thresholds():
+    df = intervention_frame(n=50000)
+    thresholds = train.compute_intervention_thresholds(df, approximate=True)
+    for name, (column, q) in train.INTERVENTION_QUANTILES.items():
+        assert rank_error(df[column].dropna().to_numpy(), thresholds[name], q) < 0.01
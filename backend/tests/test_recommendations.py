@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import train
+
+
+def agents(n=2000, seed=6):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'performance_level': pd.Categorical(rng.choice(['High', 'Medium', 'Low', None], n),
+                                            categories=['High', 'Medium', 'Low']),
+        'overall_conversion_rate': rng.uniform(size=n),
+        'activity_rate_21days': rng.uniform(size=n),
+        'tenure_months': rng.integers(0, 24, n),
+        'avg_policy_value': rng.gamma(2.0, size=n),
+        # Compacted to int8 as in the engineered frames, where 3 * x can wrap
+        'unique_proposals_last_21_days': rng.integers(0, 120, n).astype(np.int8),
+        'unique_proposals_last_7_days': rng.integers(0, 60, n).astype(np.int8),
+        'unique_customers': rng.integers(0, 50, n)
+    })
+
+
+def row_wise(df):
+    # The original df.apply rules, one row at a time
+    low_conv = df['overall_conversion_rate'].quantile(0.25)
+    low_activity = df['activity_rate_21days'].quantile(0.25)
+    low_value = df['avg_policy_value'].quantile(0.5)
+    limited_customers = df['unique_customers'].quantile(0.5)
+    low, medium, high = (train.RECOMMENDATIONS[i:i + 5] for i in (0, 5, 10))
+
+    recommendations = []
+    for row in df.to_dict('records'):
+        recs = []
+        if row['performance_level'] == 'Low':
+            recs += [low[0]] if row['overall_conversion_rate'] < low_conv else []
+            recs += [low[1]] if row['activity_rate_21days'] < low_activity else []
+            recs += [low[2]] if row['tenure_months'] <= 6 else []
+            recs += low[3:]
+        elif row['performance_level'] == 'Medium':
+            recs += [medium[0]] if row['avg_policy_value'] < low_value else []
+            spread = int(row['unique_proposals_last_21_days']) - 3 * int(row['unique_proposals_last_7_days'])
+            recs += [medium[1]] if abs(spread) > 5 else []
+            recs += [medium[2]] if row['unique_customers'] < limited_customers else []
+            recs += medium[3:]
+        elif row['performance_level'] == 'High':
+            recs += high
+        recommendations.append(recs)
+    return recommendations
+
+
+def test_matches_row_wise_rules():
+    df = agents()
+    expected = row_wise(df)
+    result = train.assign_intervention_strategies(df.copy())
+    assert result['recommendations'].tolist() == expected
+    assert (result['recommendation_mask'] > 0).sum() == sum(1 for recs in expected if recs)
+
+
+def test_given_thresholds_override_the_batch():
+    df = agents()
+    thresholds = dict.fromkeys(train.INTERVENTION_QUANTILES, np.inf)
+    result = train.assign_intervention_strategies(df.copy(), thresholds)
+    low = (df['performance_level'] == 'Low').to_numpy()
+    # Every low performer is below an infinite threshold
+    assert all(train.RECOMMENDATIONS[0] in recs for recs in result['recommendations'][low])
+
+
+def test_decode_recommendations():
+    masks = np.array([0, 1, 0b11000, 1 << 14, 0b11000, 2 ** 15 - 1], dtype=np.int32)
+    decoded = train.decode_recommendations(masks)
+    assert decoded[0] == []
+    assert decoded[1] == [train.RECOMMENDATIONS[0]]
+    assert decoded[2] == train.RECOMMENDATIONS[3:5]
+    assert decoded[3] == [train.RECOMMENDATIONS[14]]
+    assert decoded[5] == train.RECOMMENDATIONS
+    # Rows sharing a mask get their own lists
+    assert decoded[2] == decoded[4] and decoded[2] is not decoded[4]
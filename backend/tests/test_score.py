@@ -0,0 +1,61 @@
+import os
+import sys
+import pandas as pd
+import score
+import train
+
+import pytest
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'datasets')
+TRAIN_PATH = os.path.join(DATASETS, 'train_storming_round.csv')
+TEST_PATH = os.path.join(DATASETS, 'test_storming_round.csv')
+
+
+@pytest.fixture(scope='module')
+def artifact_dir(tmp_path_factory):
+    # A small forest is enough to exercise scoring
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(train, 'FEATURE_CACHE_DIR', '')
+        X_train, y_train, preprocessor = train.prepare_train_data(TRAIN_PATH)
+        model = train.train_model(X_train, y_train, preprocessor, n_jobs=1, params={'n_estimators': 5})
+        performance_df, performance_features = train.prepare_data_for_clustering(TRAIN_PATH)
+        scaler, kmeans, performance_mapping = train.train_cluster_model(performance_df, performance_features)
+    thresholds = train.compute_intervention_thresholds(performance_df)
+
+    path = str(tmp_path_factory.mktemp('artifacts'))
+    train.save_artifacts(model, scaler, kmeans, performance_mapping, artifact_dir=path)
+    untracked = os.path.join(path, open(os.path.join(path, 'LATEST')).read())
+    train.save_artifacts(model, scaler, kmeans, performance_mapping, artifact_dir=path, thresholds=thresholds)
+    return path, untracked
+
+
+def run_score(monkeypatch, *args):
+    monkeypatch.setattr(train, 'FEATURE_CACHE_DIR', '')
+    monkeypatch.setattr(sys, 'argv', ['score.py', TEST_PATH, *args])
+    score.main()
+
+
+def test_model_thresholds(artifact_dir, tmp_path, monkeypatch):
+    path, _ = artifact_dir
+    monkeypatch.setattr(train, 'ARTIFACT_DIR', path)
+    output = str(tmp_path / 'database.csv')
+    run_score(monkeypatch, '--thresholds', 'model', '--output', output)
+
+    artifacts = train.load_artifacts()
+    expected = train.score(TEST_PATH, artifacts, train.model_thresholds(artifacts))
+    scored = pd.read_csv(output, dtype={'agent_code': str})
+    assert scored['agent_code'].tolist() == expected['agent_code'].tolist()
+    assert scored['recommendations'].tolist() == expected['recommendations'].astype(str).tolist()
+    assert os.path.exists(str(tmp_path / 'database.snapshot'))
+
+    # Streamed scoring with the model's thresholds skips the quantile pass and agrees
+    streamed = str(tmp_path / 'streamed.csv')
+    run_score(monkeypatch, '--thresholds', 'model', '--output', streamed, '--chunksize', '1000')
+    assert pd.read_csv(streamed, dtype={'agent_code': str}).equals(scored)
+
+
+def test_model_without_thresholds(artifact_dir, tmp_path, monkeypatch):
+    _, untracked = artifact_dir
+    with pytest.raises(ValueError, match='no saved intervention thresholds'):
+        run_score(monkeypatch, '--artifact', untracked, '--thresholds', 'model',
+                  '--output', str(tmp_path / 'database.csv'))
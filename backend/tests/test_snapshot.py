@@ -0,0 +1,81 @@
+import json
+from snapshot import MAGIC, Snapshot, compile_snapshot, find_key, map_file, write_file
+
+import pytest
+
+
+def write_csv(path, rows):
+    path.write_text('\n'.join(rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_write_file_round_trip(tmp_path):
+    path = str(tmp_path / 'keys.bin')
+    keys = sorted([b'b2', b'a', b'c333', b'\xc3\xa9t\xc3\xa9'])
+    write_file(path, b'TESTFILE', {'count': len(keys), 'note': 'hi'}, keys, 5, b'block')
+
+    mm, header, keys_start = map_file(path, b'TESTFILE')
+    try:
+        assert header == {'count': 4, 'note': 'hi'}
+        assert keys_start % 8 == 0
+        assert mm[keys_start + 4 * 5:] == b'block'
+        for index, key in enumerate(keys):
+            assert find_key(mm, keys_start, 5, 4, key.decode('utf-8')) == index
+    finally:
+        mm.close()
+
+
+@pytest.mark.parametrize('agent_code', ['', 'b', 'b22', 'zzzz', 'c3333'])
+def test_find_key_missing(tmp_path, agent_code):
+    path = str(tmp_path / 'keys.bin')
+    write_file(path, b'TESTFILE', {}, [b'a', b'b2', b'c333'], 4)
+    mm, _, keys_start = map_file(path, b'TESTFILE')
+    try:
+        assert find_key(mm, keys_start, 4, 3, agent_code) == -1
+    finally:
+        mm.close()
+
+
+def test_map_file_rejects_other_magic(tmp_path):
+    path = str(tmp_path / 'keys.bin')
+    write_file(path, b'TESTFILE', {}, [], 1)
+    with pytest.raises(ValueError, match='not a APSNAP01 file'):
+        map_file(path, MAGIC)
+
+
+def test_compile_snapshot(tmp_path):
+    csv_path = write_csv(tmp_path / 'database.csv', [
+        'agent_code,prediction,performance_level,recommendations',
+        'b1,1,High,"[\'Keep going\']"',
+        'a1,0.0,Low,"[\'Train\', \'Keep going\']"',
+        'a1,1,High,[]',
+        'c1,,,',
+    ])
+    snapshot = Snapshot(compile_snapshot(csv_path))
+    try:
+        assert len(snapshot) == 3
+        assert snapshot.header['performance_distribution'] == {'High': 1, 'Low': 1, 'null': 1}
+        assert snapshot.header['prediction_distribution'] == {'1': 1, '0': 1, 'null': 1}
+        # The first row of an agent wins
+        assert json.loads(snapshot.get('a1')) == {
+            'agent_code': 'a1', 'prediction': 0, 'performance_level': 'Low',
+            'recommendations': ['Train', 'Keep going']
+        }
+        assert snapshot.record('c1') == (None, None, ())
+        assert snapshot.get('d1') is None
+    finally:
+        snapshot.close()
+
+
+def test_compile_snapshot_missing_columns(tmp_path):
+    csv_path = write_csv(tmp_path / 'database.csv', [
+        'agent_code,recommendations',
+        'a1,[]',
+    ])
+    snapshot = Snapshot(compile_snapshot(csv_path))
+    try:
+        assert snapshot.header['performance_distribution'] is None
+        assert snapshot.header['prediction_distribution'] is None
+        assert snapshot.record('a1') == (None, None, ())
+    finally:
+        snapshot.close()
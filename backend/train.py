@@ -1,24 +1,154 @@
+import os
+import argparse
+import copy
+import hashlib
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import time
+import joblib
+import sklearn
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pyarrow.feather as feather
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.cluster import KMeans
+from profiling import stage, staged
+from snapshot import compile_snapshot
+from history import compile_history
+from quantiles import quantile_summary
+import profiling
 
-def load_data(data_path):
+DATE_COLUMNS = ['agent_join_month', 'first_policy_sold_month', 'year_month']
 
-    df = pd.read_csv(data_path)
-    
-    # Data preparation
+# Classifier inputs
+NUMERIC_FEATURES = [
+    'agent_age', 'experience_months', 'months_to_first_sale', 'has_made_first_sale',
+    'unique_proposals_last_7_days', 'unique_proposals_last_15_days', 'unique_proposals_last_21_days',
+    'unique_proposal', 'unique_quotations_last_7_days', 'unique_quotations_last_15_days',
+    'unique_quotations_last_21_days', 'unique_quotations', 'unique_customers_last_7_days',
+    'unique_customers_last_15_days', 'unique_customers_last_21_days', 'unique_customers',
+    'new_policy_count', 'ANBP_value', 'net_income', 'number_of_policy_holders',
+    'number_of_cash_payment_policies', 'proposal_to_quotation_rate', 'quotation_to_policy_rate',
+    'avg_policy_value', 'avg_income_per_policy', 'proposal_activity_7d', 'proposal_activity_15d',
+    'proposal_activity_21d', 'proposal_trend_short', 'proposal_trend_med', 'cash_payment_ratio',
+    'proposals_per_customer', 'quotations_per_customer', 'recent_customer_ratio',
+    'policyholder_ratio', 'proposal_decay_7_to_15', 'quotation_decay_7_to_15', 'month'
+]
+
+CATEGORICAL_FEATURES = ['age_group', 'experience_group']
+
+PERFORMANCE_FEATURES = [
+    'new_policy_count',              # Sales volume
+    'ANBP_value',                    # Total sales value
+    'net_income',                    # Profitability
+    'avg_policy_value',              # Quality of sales
+    'profit_per_policy',             # Efficiency
+    'overall_conversion_rate',       # Sales efficiency
+    'proposal_to_quotation_rate',    # Stage 1 conversion
+    'quotation_to_policy_rate',      # Stage 2 conversion
+    'unique_proposals_last_21_days', # Recent activity
+    'unique_proposals_last_7_days',
+    'tenure_months',
+    'activity_rate_21days',          # Consistency in prospecting
+    'unique_customers'               # Customer reach
+]
+
+# Memory plan for the agent dataset. Integer columns are downcast to the
+# narrowest width that holds their values (checked, unlike a narrow read_csv
+# dtype, which silently wraps), rates are float32, currency-derived values
+# stay float64 and repeated strings are categorical.
+INTEGER_COLUMNS = [
+    'row_id', 'agent_age',
+    'unique_proposals_last_7_days', 'unique_proposals_last_15_days', 'unique_proposals_last_21_days',
+    'unique_proposal', 'unique_quotations_last_7_days', 'unique_quotations_last_15_days',
+    'unique_quotations_last_21_days', 'unique_quotations', 'unique_customers_last_7_days',
+    'unique_customers_last_15_days', 'unique_customers_last_21_days', 'unique_customers',
+    'new_policy_count', 'ANBP_value', 'net_income', 'number_of_policy_holders',
+    'number_of_cash_payment_policies',
+    # Engineered
+    'experience_months', 'months_to_first_sale', 'has_made_first_sale', 'target', 'month', 'year',
+    'tenure_months'
+]
+FLOAT32_COLUMNS = [
+    'proposal_to_quotation_rate', 'quotation_to_policy_rate', 'proposal_activity_7d',
+    'proposal_activity_15d', 'proposal_activity_21d', 'proposal_trend_short', 'proposal_trend_med',
+    'cash_payment_ratio', 'proposals_per_customer', 'quotations_per_customer', 'recent_customer_ratio',
+    'policyholder_ratio', 'proposal_decay_7_to_15', 'quotation_decay_7_to_15',
+    'overall_conversion_rate', 'activity_rate_21days'
+]
+CATEGORY_COLUMNS = ['agent_code']
+PERFORMANCE_LEVEL_DTYPE = pd.CategoricalDtype(['High', 'Medium', 'Low'])
+
+# Bump whenever the feature code changes so stale on-disk caches are ignored
+FEATURE_VERSION = 2
+# Directory for the on-disk feature cache (set FEATURE_CACHE_DIR='' to disable)
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', '.feature_cache')
+# Input files whose features stay cached; the least recently used are removed
+FEATURE_CACHE_KEEP = int(os.environ.get('FEATURE_CACHE_KEEP', '8'))
+
+# Directory holding the versioned model artifacts and the LATEST pointer
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', 'artifacts')
+# Bump when the layout of the saved artifact dict changes (2: cluster_counts)
+ARTIFACT_FORMAT_VERSION = 2
+# Saved versions kept in ARTIFACT_DIR; older ones are removed (0 keeps all)
+ARTIFACT_KEEP = int(os.environ.get('ARTIFACT_KEEP', '10'))
+
+# Winners of the last search.py run, reused by every later retrain
+SEARCH_RESULTS_PATH = os.environ.get('SEARCH_RESULTS_PATH', 'search_results.json')
+
+# Worker processes for forest training and inference (-1 = all cores)
+N_JOBS = int(os.environ.get('N_JOBS', '-1'))
+# Rows per inference block handed to a worker process
+PREDICT_CHUNK_SIZE = int(os.environ.get('PREDICT_CHUNK_SIZE', '100000'))
+
+# Engineered frames by input file, so each CSV is parsed once per process
+_feature_cache = {}
+
+@staged('parse_dates')
+def parse_dates(df):
     # Convert date columns to datetime
-    date_columns = ['agent_join_month', 'first_policy_sold_month', 'year_month']
-    for col in date_columns:
+    for col in DATE_COLUMNS:
         df[col] = pd.to_datetime(df[col], format='%m/%d/%Y')
-    
+    return df
+
+def compact_dtypes(df):
+    """
+    Apply the memory plan to whichever of its columns df has
+    """
+    for col in INTEGER_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def read_data(data_path, compact=True):
+    """
+    Read a raw agent CSV and parse its date columns
+    """
+    with stage('read_csv') as record:
+        if compact:
+            df = pd.read_csv(data_path, dtype={col: 'category' for col in CATEGORY_COLUMNS})
+            df = compact_dtypes(df)
+        else:
+            df = pd.read_csv(data_path)
+        record['rows'] = len(df)
+    return parse_dates(df)
+
+@staged('add_base_features')
+def add_base_features(df):
+    """
+    Derive the experience, conversion and activity features from the raw columns
+    """
     # Calculate agent's experience (in months)
     df['experience_months'] = ((df['year_month'].dt.year - df['agent_join_month'].dt.year) * 12 + 
                                       (df['year_month'].dt.month - df['agent_join_month'].dt.month))
@@ -80,6 +210,14 @@ def load_data(data_path):
     )
     return df
 
+def load_data(data_path, compact=True):
+    """
+    Read a raw agent CSV and add the base features
+    """
+    df = read_data(data_path, compact)
+    return add_base_features(df)
+
+@staged('feature_enginnering')
 def feature_enginnering(df):
 
     """
@@ -143,26 +281,15 @@ def feature_enginnering(df):
     
     return df
 
+@staged('preprocess_data')
 def preprocess_data(df, target_col='target'):
     """
     Prepare the data for modeling
     """
     # Define features to use
-    numeric_features = [
-        'agent_age', 'experience_months', 'months_to_first_sale', 'has_made_first_sale',
-        'unique_proposals_last_7_days', 'unique_proposals_last_15_days', 'unique_proposals_last_21_days',
-        'unique_proposal', 'unique_quotations_last_7_days', 'unique_quotations_last_15_days',
-        'unique_quotations_last_21_days', 'unique_quotations', 'unique_customers_last_7_days',
-        'unique_customers_last_15_days', 'unique_customers_last_21_days', 'unique_customers',
-        'new_policy_count', 'ANBP_value', 'net_income', 'number_of_policy_holders',
-        'number_of_cash_payment_policies', 'proposal_to_quotation_rate', 'quotation_to_policy_rate',
-        'avg_policy_value', 'avg_income_per_policy', 'proposal_activity_7d', 'proposal_activity_15d',
-        'proposal_activity_21d', 'proposal_trend_short', 'proposal_trend_med', 'cash_payment_ratio',
-        'proposals_per_customer', 'quotations_per_customer', 'recent_customer_ratio',
-        'policyholder_ratio', 'proposal_decay_7_to_15', 'quotation_decay_7_to_15', 'month'
-    ]
+    numeric_features = NUMERIC_FEATURES
     
-    categorical_features = ['age_group', 'experience_group']
+    categorical_features = CATEGORICAL_FEATURES
     
     # Split features and target
     X = df[numeric_features + categorical_features]
@@ -203,11 +330,8 @@ def prepare_train_data(data_path):
     """
     Load and preprocess the data
     """
-    # Load data
-    df = load_data(data_path)
-    
-    # Feature engineering
-    df = feature_enginnering(df)
+    # Load and engineer features (shared with the clustering path)
+    df, _, _ = build_features(data_path)
     
     # Preprocess data
     X_train,y_train, preprocessor = preprocess_data(df)
@@ -218,83 +342,153 @@ def prepare_test_data(data_path):
     """
     Load and preprocess the test data
     """
-    # Load data
-    df = load_data(data_path)
-    
-    # Feature engineering
-    df = feature_enginnering(df)
+    # Load and engineer features (shared with the clustering path)
+    df, _, _ = build_features(data_path)
     return df
 
-def prepare_data_for_clustering(data_path):
+@staged('clustering_features')
+def clustering_features(df):
     """
-    Load and preprocess the data for clustering
+    Build the clustering performance features from an engineered frame
     """
-    # Load data
-    df = pd.read_csv(data_path)
+    # The clustering features divide by max(denominator, 1) instead of
+    # returning 0, which is the convention the cluster weights were tuned on,
+    # so those ratios are kept separate from the classifier's columns.
+    # Identical derivations are shared.
+    performance_df = pd.DataFrame({
+        'new_policy_count': df['new_policy_count'],
+        'ANBP_value': df['ANBP_value'],
+        'net_income': df['net_income'],
+        'avg_policy_value': df['ANBP_value'] / df['new_policy_count'].replace(0, 1),
+        'profit_per_policy': df['net_income'] / df['new_policy_count'].replace(0, 1),
+        'overall_conversion_rate': df['new_policy_count'] / df['unique_proposal'].replace(0, 1),
+        'proposal_to_quotation_rate': df['unique_quotations'] / df['unique_proposal'].replace(0, 1),
+        'quotation_to_policy_rate': df['new_policy_count'] / df['unique_quotations'].replace(0, 1),
+        'unique_proposals_last_21_days': df['unique_proposals_last_21_days'],
+        'unique_proposals_last_7_days': df['unique_proposals_last_7_days'],
+        'tenure_months': df['experience_months'],
+        'activity_rate_21days': df['proposal_activity_21d'],
+        'unique_customers': df['unique_customers']
+    }, columns=PERFORMANCE_FEATURES)
+    # Add agent code 
+    performance_df['agent_code'] = df['agent_code']
+    # Handle missing values
+    performance_df.fillna(0, inplace=True)
 
-    # Convert date columns to datetime format
-    date_columns = ['agent_join_month', 'first_policy_sold_month', 'year_month']
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col])
+    return performance_df, list(PERFORMANCE_FEATURES)
 
-    # Calculate tenure (months since joining)
-    df['tenure_months'] = ((df['year_month'].dt.year - df['agent_join_month'].dt.year) * 12 + 
-                            (df['year_month'].dt.month - df['agent_join_month'].dt.month))
+def file_digest(path):
+    """
+    SHA-256 of a file's contents, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-    # Calculate months to first sale
-    df['months_to_first_sale'] = ((df['first_policy_sold_month'].dt.year - df['agent_join_month'].dt.year) * 12 + 
-                                    (df['first_policy_sold_month'].dt.month - df['agent_join_month'].dt.month))
+def feature_cache_paths(data_path, cache_dir):
+    # Keyed by input contents and feature code version, not by file name
+    key = hashlib.sha256(f"{file_digest(data_path)}:{FEATURE_VERSION}".encode()).hexdigest()[:24]
+    return (os.path.join(cache_dir, f"features-{key}.feather"),
+            os.path.join(cache_dir, f"performance-{key}.feather"))
 
-    # Replace negative values with 0 (for cases where first_policy_sold_month is before agent_join_month)
-    df['months_to_first_sale'] = df['months_to_first_sale'].clip(lower=0)
+@staged('read_feature_cache')
+def read_feather(path):
+    # The files are uncompressed, so the mapped columns are read in place and
+    # to_pandas makes the only copy
+    return feather.read_table(path, memory_map=True).to_pandas()
 
-    # Calculate conversion rates
-    df['proposal_to_quotation_rate'] = df['unique_quotations'] / df['unique_proposal'].replace(0, 1)
-    df['quotation_to_policy_rate'] = df['new_policy_count'] / df['unique_quotations'].replace(0, 1)
-    df['overall_conversion_rate'] = df['new_policy_count'] / df['unique_proposal'].replace(0, 1)
+def write_feather(df, path):
+    # Per-process tmp name: an API retrain and a CLI run may write the same entry
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
 
-    # Calculate average policy value
-    df['avg_policy_value'] = df['ANBP_value'] / df['new_policy_count'].replace(0, 1)
-
-    # Calculate profit per policy
-    df['profit_per_policy'] = df['net_income'] / df['new_policy_count'].replace(0, 1)
-
-    # Calculate activity metrics
-    df['activity_rate_7days'] = df['unique_proposals_last_7_days'] / 7
-    df['activity_rate_15days'] = df['unique_proposals_last_15_days'] / 15
-    df['activity_rate_21days'] = df['unique_proposals_last_21_days'] / 21
-
-    # Calculate cash payment percentage
-    df['cash_payment_percentage'] = df['number_of_cash_payment_policies'] / df['number_of_policy_holders'].replace(0, 1) * 100
-
-    performance_features = [
-        'new_policy_count',              # Sales volume
-        'ANBP_value',                    # Total sales value
-        'net_income',                    # Profitability
-        'avg_policy_value',              # Quality of sales
-        'profit_per_policy',             # Efficiency
-        'overall_conversion_rate',       # Sales efficiency
-        'proposal_to_quotation_rate',    # Stage 1 conversion
-        'quotation_to_policy_rate',      # Stage 2 conversion
-        'unique_proposals_last_21_days', # Recent activity
-        'unique_proposals_last_7_days',
-        'tenure_months',
-        'activity_rate_21days',          # Consistency in prospecting
-        'unique_customers'               # Customer reach
-    ]
+def prune_feature_cache(cache_dir, keep=None):
+    """
+    Remove all but the keep most recently used cache entries (each a features/performance pair)
+    """
+    if keep is None:
+        keep = FEATURE_CACHE_KEEP
+    entries = {}
+    for name in os.listdir(cache_dir):
+        if name.startswith('features-') and name.endswith('.feather'):
+            path = os.path.join(cache_dir, name)
+            entries[path] = os.path.getmtime(path)
+    for path in sorted(entries, key=entries.get, reverse=True)[keep:]:
+        for stale in (path, path.replace('features-', 'performance-', 1)):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
 
-    # Select only the relevant features for performance evaluation
-    performance_df = df[performance_features].copy()
-    # Add agent code 
-    performance_df['agent_code'] = df['agent_code']
-    # Handle missing values
-    performance_df.fillna(0, inplace=True)
+def engineer_features(df, compact=True):
+    """
+    Run the feature pipeline on a frame from read_data, returning (df, performance_df)
+    """
+    df = feature_enginnering(add_base_features(df))
+    performance_df, _ = clustering_features(df)
+    if compact:
+        df = compact_dtypes(df)
+        performance_df = compact_dtypes(performance_df)
+    return df, performance_df
 
+def build_features(data_path, cache_dir=None):
+    """
+    Parse a CSV once and build both the classifier and the clustering feature sets.
+
+    Returns (df, performance_df, performance_features); results are cached per
+    file version so the train and test paths each read their CSV once. Across
+    runs the engineered frames are cached in cache_dir as Feather files keyed
+    by the input's content hash and FEATURE_VERSION.
+    """
+    if cache_dir is None:
+        cache_dir = FEATURE_CACHE_DIR
+    stat = os.stat(data_path)
+    key = (os.path.abspath(data_path), stat.st_mtime_ns, stat.st_size)
+    if key in _feature_cache:
+        return _feature_cache[key]
+
+    if cache_dir:
+        features_path, performance_path = feature_cache_paths(data_path, cache_dir)
+        if os.path.exists(features_path) and os.path.exists(performance_path):
+            df = read_feather(features_path)
+            performance_df = read_feather(performance_path)
+            # Mark the entry as used, for prune_feature_cache
+            os.utime(features_path)
+            _feature_cache[key] = (df, performance_df, list(PERFORMANCE_FEATURES))
+            return _feature_cache[key]
+
+    df, performance_df = engineer_features(read_data(data_path))
+    performance_features = list(PERFORMANCE_FEATURES)
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_feather(df, features_path)
+        write_feather(performance_df, performance_path)
+        prune_feature_cache(cache_dir)
 
+    _feature_cache[key] = (df, performance_df, performance_features)
+    return _feature_cache[key]
+
+def clear_feature_cache():
+    _feature_cache.clear()
+
+def prepare_data_for_clustering(data_path):
+    """
+    Load and preprocess the data for clustering
+    """
+    _, performance_df, performance_features = build_features(data_path)
     return performance_df, performance_features
     
     
-def train_cluster_model(df, performance_features):
+@staged('train_cluster_model')
+def train_cluster_model(df, performance_features, n_clusters=3):
+    if n_clusters != len(PERFORMANCE_LEVEL_DTYPE.categories):
+        raise ValueError(f"rank_clusters labels exactly {len(PERFORMANCE_LEVEL_DTYPE.categories)} clusters "
+                         f"(High/Medium/Low), got n_clusters={n_clusters}")
+
     # Select only numerical features for scaling
     numerical_features = df[performance_features].select_dtypes(include=['number']).columns
     
@@ -303,11 +497,25 @@ def train_cluster_model(df, performance_features):
     scaled_features = scaler.fit_transform(df[numerical_features])
 
     # K-means clustering
-    kmeans = KMeans(n_clusters=3, random_state=42)
-    clusters = kmeans.fit_predict(scaled_features)
+    # rank_clusters maps the best cluster to High, the next to Medium and the rest to Low
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    with stage('kmeans_fit', rows=len(df)):
+        clusters = kmeans.fit_predict(scaled_features)
 
     # Analyze cluster centers (reverse scale them back to original space)
     cluster_centers = pd.DataFrame(scaler.inverse_transform(kmeans.cluster_centers_), columns=numerical_features)
+    performance_mapping = rank_clusters(cluster_centers)
+
+    return scaler, kmeans, performance_mapping
+
+def rank_clusters(cluster_centers):
+    """
+    Map cluster index to High/Medium/Low from cluster centers in original units
+    """
+    # One cluster per level; with other counts a level would be missing or shared
+    if len(cluster_centers) != len(PERFORMANCE_LEVEL_DTYPE.categories):
+        raise ValueError(f"Can't rank {len(cluster_centers)} clusters into "
+                         f"{'/'.join(PERFORMANCE_LEVEL_DTYPE.categories)}")
 
     # Composite score based on feature importance
     weights = {
@@ -327,14 +535,11 @@ def train_cluster_model(df, performance_features):
     # Calculate the composite score for each cluster center using the weights
     composite_scores = cluster_centers[weights.keys()].multiply(list(weights.values()), axis=1).sum(axis=1)
 
-    # Rank the clusters based on composite scores (higher score = better performance)
-    cluster_rankings = composite_scores.rank(ascending=False)
-
-    # Rank clusters based on composite score
+    # Rank clusters based on composite score (higher score = better performance)
     cluster_rankings = composite_scores.rank(ascending=False)
     performance_mapping = {}
 
-    for cluster in range(3):
+    for cluster in range(len(cluster_centers)):
         if cluster_rankings[cluster] == 1:
             performance_mapping[cluster] = 'High'
         elif cluster_rankings[cluster] == 2:
@@ -342,121 +547,521 @@ def train_cluster_model(df, performance_features):
         else:
             performance_mapping[cluster] = 'Low'
 
-    return scaler, kmeans, performance_mapping
+    return performance_mapping
 
+def scale_centers(scaler, centers, performance_features):
+    # KMeans.predict needs C-ordered centers; transforming a frame returns Fortran order
+    scaled = scaler.transform(pd.DataFrame(centers, columns=performance_features))
+    return np.ascontiguousarray(scaled)
 
+@staged('update_cluster_model')
+def update_cluster_model(df, performance_features, scaler, kmeans, cluster_counts):
+    """
+    Fold new rows into a fitted clustering with one warm-started mini-batch update.
+
+    The scaler statistics are updated with partial_fit and each centroid moves
+    to the running mean of everything assigned to it so far (cluster_counts
+    holds those totals), so the cost depends only on the new rows. Cluster
+    indexes are kept, and the High/Medium/Low mapping is re-ranked on the
+    updated centroids, so a level only changes if its composite score
+    overtakes another cluster's. The inputs are not modified.
 
-def predict_performance(test_data_path, scaler, kmeans, performance_mapping):
+    Returns (scaler, kmeans, performance_mapping, cluster_counts).
+    """
+    X = df[performance_features]
 
-    # Prepare data for clustering
-    test_df, _ = prepare_data_for_clustering(test_data_path)
+    # Centroids in original units. Means commute with the scaler's affine
+    # transform, so they can be updated there and rescaled afterwards.
+    centers = scaler.inverse_transform(kmeans.cluster_centers_)
 
-    # Select only numerical columns for scaling (exclude 'agent_code' and any non-numeric columns)
-    numerical_columns = test_df.select_dtypes(include=['number']).columns
+    new_scaler = copy.deepcopy(scaler)
+    new_scaler.partial_fit(X)
 
+    # Assign the new rows to the nearest warm-started centroid
+    new_kmeans = copy.deepcopy(kmeans)
+    new_kmeans.cluster_centers_ = scale_centers(new_scaler, centers, performance_features)
+    labels = new_kmeans.predict(new_scaler.transform(X))
+
+    # Running-mean update of each centroid with its new members
+    values = X.to_numpy(dtype=np.float64)
+    counts = np.asarray(cluster_counts, dtype=np.int64).copy()
+    for cluster in range(len(centers)):
+        members = values[labels == cluster]
+        if len(members):
+            centers[cluster] = (counts[cluster] * centers[cluster] + members.sum(axis=0)) / (counts[cluster] + len(members))
+            counts[cluster] += len(members)
+
+    new_kmeans.cluster_centers_ = scale_centers(new_scaler, centers, performance_features)
+    # labels_ now describes the batch that was folded in
+    new_kmeans.labels_ = labels
+
+    performance_mapping = rank_clusters(pd.DataFrame(centers, columns=performance_features))
+    return new_scaler, new_kmeans, performance_mapping, counts
+
+
+
+@staged('predict_performance')
+def predict_performance(test_data_path, scaler, kmeans, performance_mapping, thresholds=None):
+
+    # Prepare data for clustering (copied, the cached frame is shared)
+    test_df, performance_features = prepare_data_for_clustering(test_data_path)
+    test_df = test_df.copy()
+
+    test_df = assign_performance(test_df, performance_features, scaler, kmeans, performance_mapping, thresholds)
+
+    # Return the results
+    return test_df[['agent_code', 'performance_level', 'recommendations']]
+
+def assign_performance(test_df, performance_features, scaler, kmeans, performance_mapping, thresholds=None):
+    """
+    Assign clusters, performance levels and recommendations to a clustering frame
+    """
     # Standardize using the previously fitted scaler
-    scaled_test_features = scaler.transform(test_df[numerical_columns])
+    scaled_test_features = scaler.transform(test_df[performance_features])
 
     # Predict cluster labels using the fitted KMeans model
     test_clusters = kmeans.predict(scaled_test_features)
 
     # Map the clusters to performance levels
     test_df['cluster'] = test_clusters
-    test_df['performance_level'] = test_df['cluster'].map(performance_mapping)
+    test_df['performance_level'] = test_df['cluster'].map(performance_mapping).astype(PERFORMANCE_LEVEL_DTYPE)
 
     # Generate intervention strategies
-    test_df = assign_intervention_strategies(test_df)
+    return assign_intervention_strategies(test_df, thresholds)
 
-    # Return the results
-    return test_df[['agent_code', 'performance_level', 'recommendations']]
 
+# Intervention recommendations, indexed by their bit in the recommendation mask.
+# Rows list them in this order, grouped by performance level.
+RECOMMENDATIONS = [
+    # Low performers
+    "Sales Training: Focus on improving conversion techniques and objection handling.",
+    "Activity Management: Set daily prospecting targets and provide closer supervision.",
+    "Mentorship Program: Pair with experienced agent for shadowing and guidance.",
+    "Weekly Performance Review: Schedule weekly one-on-one sessions to review metrics and provide feedback.",
+    "Product Knowledge: Complete refresher course on core products.",
+    # Medium performers
+    "Upselling Training: Focus on identifying opportunities for premium products.",
+    "Consistency Program: Implement daily activity tracking and regular scheduling.",
+    "Networking Strategy: Provide resources for expanding customer base and referrals.",
+    "Specialized Product Training: Advanced training on high-margin products.",
+    "Monthly Group Coaching: Join peer group sessions to share best practices.",
+    # High performers
+    "Client Retention Program: Implement a structured follow-up system for existing clients.",
+    "Leadership Development: Prepare for team leadership and mentoring roles.",
+    "Advanced Sales Techniques: Training on complex products and high-net-worth client acquisition.",
+    "Recognition Program: Highlight achievements in company communications and events.",
+    "Career Path Planning: Set long-term goals and development plan for advancement."
+]
 
-def assign_intervention_strategies(df):
-    # Precompute thresholds
-    low_conv_thresh = df['overall_conversion_rate'].quantile(0.25)
-    low_activity_thresh = df['activity_rate_21days'].quantile(0.25)
-    low_value_thresh = df['avg_policy_value'].quantile(0.5)
-    limited_customers_thresh = df['unique_customers'].quantile(0.5)
 
-    def generate_recs(row):
-        recs = []
+# Clustering column and quantile behind each intervention threshold
+INTERVENTION_QUANTILES = {
+    'low_conv_thresh': ('overall_conversion_rate', 0.25),
+    'low_activity_thresh': ('activity_rate_21days', 0.25),
+    'low_value_thresh': ('avg_policy_value', 0.5),
+    'limited_customers_thresh': ('unique_customers', 0.5)
+}
 
-        # Low performers
-        if row['performance_level'] == 'Low':
-            if row['overall_conversion_rate'] < low_conv_thresh:
-                recs.append("Sales Training: Focus on improving conversion techniques and objection handling.")
-            if row['activity_rate_21days'] < low_activity_thresh:
-                recs.append("Activity Management: Set daily prospecting targets and provide closer supervision.")
-            if row['tenure_months'] <= 6:
-                recs.append("Mentorship Program: Pair with experienced agent for shadowing and guidance.")
-            recs.extend([
-                "Weekly Performance Review: Schedule weekly one-on-one sessions to review metrics and provide feedback.",
-                "Product Knowledge: Complete refresher course on core products."
-            ])
 
-        # Medium performers
-        elif row['performance_level'] == 'Medium':
-            if row['avg_policy_value'] < low_value_thresh:
-                recs.append("Upselling Training: Focus on identifying opportunities for premium products.")
-            if abs(row['unique_proposals_last_21_days'] - 3 * row['unique_proposals_last_7_days']) > 5:
-                recs.append("Consistency Program: Implement daily activity tracking and regular scheduling.")
-            if row['unique_customers'] < limited_customers_thresh:
-                recs.append("Networking Strategy: Provide resources for expanding customer base and referrals.")
-            recs.extend([
-                "Specialized Product Training: Advanced training on high-margin products.",
-                "Monthly Group Coaching: Join peer group sessions to share best practices."
-            ])
+def decode_recommendations(masks):
+    """
+    Turn recommendation bitmasks into lists of recommendation strings
+    """
+    # Only a handful of distinct masks exist, so decode each one once
+    unique_masks, inverse = np.unique(masks, return_inverse=True)
+    decoded = [
+        [text for bit, text in enumerate(RECOMMENDATIONS) if mask >> bit & 1]
+        for mask in unique_masks.tolist()
+    ]
+    return [list(decoded[i]) for i in inverse.ravel().tolist()]
 
+
+def threshold_summaries(performance_df, approximate=False):
+    """
+    Mergeable quantile summaries of the intervention threshold columns
+    """
+    return {name: quantile_summary(approximate).update(performance_df[column].to_numpy(dtype=np.float64))
+            for name, (column, _) in INTERVENTION_QUANTILES.items()}
+
+
+def merge_threshold_summaries(parts):
+    merged = None
+    for part in parts:
+        if merged is None:
+            merged = part
+        else:
+            for name, summary in part.items():
+                merged[name].merge(summary)
+    return merged
+
+
+def thresholds_from_summaries(summaries):
+    return {name: summaries[name].quantile(q) for name, (_, q) in INTERVENTION_QUANTILES.items()}
+
+
+def compute_intervention_thresholds(df, approximate=False):
+    return thresholds_from_summaries(threshold_summaries(df, approximate))
+
+
+@staged('assign_intervention_strategies')
+def assign_intervention_strategies(df, thresholds=None):
+    # Thresholds are quantiles over the whole batch; streamed scoring passes
+    # them in because a single chunk is not the whole batch
+    if thresholds is None:
+        thresholds = compute_intervention_thresholds(df)
+    low_conv_thresh = thresholds['low_conv_thresh']
+    low_activity_thresh = thresholds['low_activity_thresh']
+    low_value_thresh = thresholds['low_value_thresh']
+    limited_customers_thresh = thresholds['limited_customers_thresh']
+
+    low = (df['performance_level'] == 'Low').to_numpy()
+    medium = (df['performance_level'] == 'Medium').to_numpy()
+    high = (df['performance_level'] == 'High').to_numpy()
+
+    # One boolean mask per recommendation, in the order of RECOMMENDATIONS
+    rules = [
+        # Low performers
+        low & (df['overall_conversion_rate'] < low_conv_thresh).to_numpy(),
+        low & (df['activity_rate_21days'] < low_activity_thresh).to_numpy(),
+        low & (df['tenure_months'] <= 6).to_numpy(),
+        low,
+        low,
+        # Medium performers
+        medium & (df['avg_policy_value'] < low_value_thresh).to_numpy(),
+        # Widened first: the counts may be stored as int8, where 3 * x can wrap
+        medium & ((df['unique_proposals_last_21_days'].astype(np.int64)
+                   - 3 * df['unique_proposals_last_7_days'].astype(np.int64)).abs() > 5).to_numpy(),
+        medium & (df['unique_customers'] < limited_customers_thresh).to_numpy(),
+        medium,
+        medium,
         # High performers
-        elif row['performance_level'] == 'High':
-            recs.extend([
-                "Client Retention Program: Implement a structured follow-up system for existing clients.",
-                "Leadership Development: Prepare for team leadership and mentoring roles.",
-                "Advanced Sales Techniques: Training on complex products and high-net-worth client acquisition.",
-                "Recognition Program: Highlight achievements in company communications and events.",
-                "Career Path Planning: Set long-term goals and development plan for advancement."
-            ])
-
-        return recs
-
-    # Apply recommendation generator to each row
-    df['recommendations'] = df.apply(generate_recs, axis=1)
+        high,
+        high,
+        high,
+        high,
+        high
+    ]
+
+    # Pack the rules into one bitmask per agent
+    masks = np.zeros(len(df), dtype=np.int32)
+    for bit, rule in enumerate(rules):
+        masks |= rule.astype(np.int32) << bit
+
+    df['recommendation_mask'] = masks
+    df['recommendations'] = decode_recommendations(masks)
     return df
 
 
 
 
-def train_model(X_train, y_train, preprocessor):
+@staged('train_model')
+def train_model(X_train, y_train, preprocessor, n_jobs=None, params=None):
     """
     Train multiple models and select the best one
     """
-    # Define models to try
-    model = RandomForestClassifier(random_state=42)
+    if n_jobs is None:
+        n_jobs = N_JOBS
+
+    # Define models to try (trees are seeded from random_state, so the
+    # result does not depend on n_jobs); params come from search.py
+    model = RandomForestClassifier(random_state=42, n_jobs=n_jobs, **(params or {}))
         
+    # Train the model, fitting the steps one at a time (as Pipeline.fit does)
+    # so the preprocessing and forest are timed separately
+    with stage('preprocessor_fit', rows=len(X_train)):
+        X_transformed = preprocessor.fit_transform(X_train, y_train)
+    with stage('forest_fit', rows=len(X_train)):
+        model.fit(X_transformed, y_train)
+
     # Create pipeline with preprocessing
     pipeline = Pipeline(steps=[
         ('preprocessor', preprocessor),
         ('classifier', model)
     ])
-        
-    # Train the model
-    pipeline.fit(X_train, y_train)
 
     return pipeline
 
-def predict_sales(test_data_path, model):
+# Model used by predict worker processes, set once per process by _init_predict_worker
+_worker_model = None
+
+def _init_predict_worker(model):
+    global _worker_model
+    _worker_model = model
+    # Parallelism comes from the process pool, so each worker predicts on one core
+    _worker_model.set_params(classifier__n_jobs=1)
+
+def _predict_chunk(X):
+    return _worker_model.predict(X)
+
+def map_bounded(executor, fn, items, max_in_flight):
+    """
+    Like executor.map, but only keeps max_in_flight items submitted at a time
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def predict_in_chunks(model, X, chunk_size=None, n_jobs=None):
+    """
+    Predict fixed-size row blocks across a process pool, keeping results in row order
+    """
+    if chunk_size is None:
+        chunk_size = PREDICT_CHUNK_SIZE
+    n_workers = joblib.effective_n_jobs(N_JOBS if n_jobs is None else n_jobs)
+    if len(X) <= chunk_size or n_workers == 1:
+        return model.predict(X)
+
+    chunks = (X.iloc[start:start + chunk_size] for start in range(0, len(X), chunk_size))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_predict_worker,
+                             initargs=(model,)) as executor:
+        # Two blocks per worker in flight bounds memory regardless of input size
+        return np.concatenate(list(map_bounded(executor, _predict_chunk, chunks, 2 * n_workers)))
+
+@staged('predict_sales')
+def predict_sales(test_data_path, model, chunk_size=None, n_jobs=None):
     """
     Predict sales using the trained model
     """
     # Predict on test data
     test_data = prepare_test_data(test_data_path)
     
-    # Predict on test data
-    predictions = 1 - model.predict(test_data)
+    # Predict on test data (only the model inputs are sent to the workers)
+    X = test_data[NUMERIC_FEATURES + CATEGORICAL_FEATURES]
+    predictions = 1 - predict_in_chunks(model, X, chunk_size, n_jobs)
+
+    sales_predictions = test_data[['agent_code']].copy()
+    sales_predictions['prediction'] = predictions
+
+    return sales_predictions
 
-    test_data['prediction'] = predictions
 
-    return test_data[['agent_code', 'prediction']]
+@staged('save_artifacts')
+def save_artifacts(pipeline, scaler, kmeans, performance_mapping, artifact_dir=None, cluster_counts=None,
+                   thresholds=None):
+    """
+    Save the fitted models as a new versioned artifact and point LATEST at it
+    """
+    if artifact_dir is None:
+        artifact_dir = ARTIFACT_DIR
+    os.makedirs(artifact_dir, exist_ok=True)
+    if cluster_counts is None:
+        # Rows behind each centroid, needed to warm-start update_cluster_model
+        cluster_counts = np.bincount(kmeans.labels_, minlength=kmeans.n_clusters)
+
+    version = time.strftime('%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(artifact_dir, f"model-{version}.joblib")):
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+        suffix += 1
+    artifacts = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'version': version,
+        'feature_version': FEATURE_VERSION,
+        'sklearn_version': sklearn.__version__,
+        'pipeline': pipeline,
+        'scaler': scaler,
+        'kmeans': kmeans,
+        'performance_mapping': performance_mapping,
+        'cluster_counts': cluster_counts,
+        # Training-data intervention thresholds, for scoring batches consistently
+        'intervention_thresholds': thresholds
+    }
+
+    artifact_path = os.path.join(artifact_dir, f"model-{version}.joblib")
+    joblib.dump(artifacts, f"{artifact_path}.tmp")
+    os.replace(f"{artifact_path}.tmp", artifact_path)
+
+    latest_path = os.path.join(artifact_dir, 'LATEST')
+    with open(f"{latest_path}.tmp", 'w') as f:
+        f.write(os.path.basename(artifact_path))
+    os.replace(f"{latest_path}.tmp", latest_path)
+
+    prune_artifacts(artifact_dir, artifact_path)
+    return artifact_path
+
+def prune_artifacts(artifact_dir, latest_path, keep=None):
+    """
+    Remove all but the keep newest saved artifacts, never the one LATEST points at
+    """
+    if keep is None:
+        keep = ARTIFACT_KEEP
+    if keep <= 0:
+        return
+    names = sorted((name for name in os.listdir(artifact_dir)
+                    if name.startswith('model-') and name.endswith('.joblib')),
+                   key=lambda name: os.path.getmtime(os.path.join(artifact_dir, name)))
+    for name in names[:-keep]:
+        if name != os.path.basename(latest_path):
+            os.remove(os.path.join(artifact_dir, name))
+
+def model_thresholds(artifacts):
+    """
+    The intervention thresholds saved with an artifact
+    """
+    if artifacts.get('intervention_thresholds') is None:
+        raise ValueError(f"Model version {artifacts['version']} has no saved intervention thresholds; "
+                         f"retrain with train.py")
+    return artifacts['intervention_thresholds']
+
+def load_artifacts(artifact_path=None, artifact_dir=None):
+    """
+    Load a saved artifact, by default the one LATEST points at
+    """
+    if artifact_dir is None:
+        artifact_dir = ARTIFACT_DIR
+    if artifact_path is None:
+        with open(os.path.join(artifact_dir, 'LATEST')) as f:
+            artifact_path = os.path.join(artifact_dir, f.read().strip())
+
+    artifacts = joblib.load(artifact_path)
+    if artifacts.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"{artifact_path} has artifact format {artifacts.get('format_version')}, "
+                         f"expected {ARTIFACT_FORMAT_VERSION}; retrain with train.py")
+    if artifacts['feature_version'] != FEATURE_VERSION:
+        raise ValueError(f"{artifact_path} was trained on feature version {artifacts['feature_version']}, "
+                         f"expected {FEATURE_VERSION}; retrain with train.py")
+    # scikit-learn only supports unpickling models with the version that saved them
+    if artifacts['sklearn_version'] != sklearn.__version__:
+        raise ValueError(f"{artifact_path} was saved with scikit-learn {artifacts['sklearn_version']}, "
+                         f"running {sklearn.__version__}; retrain with train.py")
+    return artifacts
+
+def load_search_results(path=None):
+    """
+    Forest params chosen by search.py, or the defaults ({}) if it hasn't run
+    """
+    try:
+        with open(path or SEARCH_RESULTS_PATH) as f:
+            results = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return results['best_forest_params']
+
+def score(test_data_path, artifacts, thresholds=None):
+    """
+    Predict sales and performance levels for a monthly file with fitted models.
+
+    Intervention thresholds default to quantiles of the file itself.
+    """
+    sales_predictions = predict_sales(test_data_path, artifacts['pipeline'])
+    performance_predictions = predict_performance(test_data_path, artifacts['scaler'], artifacts['kmeans'],
+                                                  artifacts['performance_mapping'], thresholds)
+
+    # Merge predictions with performance data
+    return pd.merge(sales_predictions, performance_predictions, on='agent_code', how='left')
+
+def iter_feature_chunks(data_path, chunksize):
+    """
+    Read a CSV in chunks and yield (df, performance_df) feature frames per chunk
+    """
+    # Every feature is derived row by row, so chunks engineer independently
+    dtype = {col: 'category' for col in CATEGORY_COLUMNS}
+    for chunk in pd.read_csv(data_path, chunksize=chunksize, dtype=dtype):
+        yield engineer_features(parse_dates(compact_dtypes(chunk)))
+
+def _chunk_threshold_summaries(task):
+    chunk, approximate = task
+    _, performance_df = engineer_features(parse_dates(compact_dtypes(chunk)))
+    return threshold_summaries(performance_df, approximate)
+
+def streaming_intervention_thresholds(data_paths, chunksize, approximate=False, n_jobs=None):
+    """
+    First pass of streamed scoring: the batch-wide intervention thresholds.
+
+    data_paths is one CSV or a list of partitions of the batch. Chunks are
+    summarized in parallel worker processes and the summaries merged; exact
+    summaries keep the four threshold columns, approximate ones (KLL
+    sketches) use constant memory however large the batch.
+    """
+    if isinstance(data_paths, str):
+        data_paths = [data_paths]
+    dtype = {col: 'category' for col in CATEGORY_COLUMNS}
+    tasks = ((chunk, approximate) for path in data_paths
+             for chunk in pd.read_csv(path, chunksize=chunksize, dtype=dtype))
+
+    n_workers = joblib.effective_n_jobs(N_JOBS if n_jobs is None else n_jobs)
+    if n_workers == 1:
+        summaries = merge_threshold_summaries(map(_chunk_threshold_summaries, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            summaries = merge_threshold_summaries(map_bounded(executor, _chunk_threshold_summaries, tasks, 2 * n_workers))
+    return thresholds_from_summaries(summaries)
+
+@staged('score_streaming')
+def score_streaming(test_data_path, artifacts, output_path='database.csv', chunksize=100000,
+                    thresholds=None, approximate=False):
+    """
+    Score a monthly file chunk by chunk, appending each chunk's predictions to output_path
+    """
+    # Pass 1: the intervention thresholds are quantiles over the whole file,
+    # unless fixed thresholds (such as the model's) are given
+    if thresholds is None:
+        thresholds = streaming_intervention_thresholds(test_data_path, chunksize, approximate)
+
+    # Pass 2: score each chunk and append it to the output
+    tmp_path = f"{output_path}.tmp"
+    rows = 0
+    with open(tmp_path, 'w', newline='') as f:
+        for i, (df, performance_df) in enumerate(iter_feature_chunks(test_data_path, chunksize)):
+            X = df[NUMERIC_FEATURES + CATEGORICAL_FEATURES]
+            predictions = 1 - artifacts['pipeline'].predict(X)
+            performance_df = assign_performance(performance_df, PERFORMANCE_FEATURES, artifacts['scaler'],
+                                                artifacts['kmeans'], artifacts['performance_mapping'], thresholds)
+
+            # Both frames come from the same rows, so they line up positionally
+            # (the same result as score()'s merge when agent codes are unique)
+            result = pd.DataFrame({
+                'agent_code': df['agent_code'],
+                'prediction': predictions,
+                'performance_level': performance_df['performance_level'],
+                'recommendations': performance_df['recommendations']
+            })
+            result.to_csv(f, header=(i == 0), index=False)
+            rows += len(result)
+
+    # Publish the finished file atomically, then its compiled snapshot
+    os.replace(tmp_path, output_path)
+    compile_snapshot(output_path)
+    return rows
+
+def memory_report(data_path):
+    """
+    Memory footprint of the raw and engineered frames without and with the memory plan
+    """
+    def megabytes(*frames):
+        return sum(frame.memory_usage(deep=True).sum() for frame in frames) / 2**20
+
+    report = {}
+    for label, compact in [('before', False), ('after', True)]:
+        raw = read_data(data_path, compact)
+        report[f'raw_mb_{label}'] = megabytes(raw)
+        df, performance_df = engineer_features(raw, compact)
+        report[f'engineered_mb_{label}'] = megabytes(df, performance_df)
+    report['rows'] = len(df)
+    return report
+
+@staged('write_database')
+def write_database(df, path='database.csv'):
+    """
+    Publish the predictions atomically so a running backend never reads a half-written file
+    """
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    # Compile the memory-mapped snapshot the backend workers serve from
+    compile_snapshot(path)
+
+@staged('write_history')
+def write_history(df, path='history.snapshot'):
+    """
+    Compile every agent's monthly metrics from an engineered frame into the history store
+    """
+    return compile_history(df, path)
     
 
 if __name__ == "__main__":
@@ -465,20 +1070,80 @@ if __name__ == "__main__":
     train_data_path = '../datasets/train_storming_round.csv'
     test_data_path = '../datasets/test_storming_round.csv'
 
+    parser = argparse.ArgumentParser(description="Train the models and write database.csv")
+    parser.add_argument('--memory-report', action='store_true',
+                        help="print the training data's memory footprint with and without the memory plan, then exit")
+    parser.add_argument('--profile', metavar='JSON', default=None,
+                        help="record per-stage timings and memory to this JSON report (or set TRAIN_PROFILE)")
+    parser.add_argument('--cprofile', action='store_true',
+                        help="with --profile or TRAIN_PROFILE, also dump a cProfile of the slowest stage next to the report")
+    parser.add_argument('--update-clusters', metavar='CSV', default=None,
+                        help="fold a new monthly file into the latest saved clustering and save a new version")
+    parser.add_argument('--output', default='database.csv', help="where to write the predictions")
+    parser.add_argument('--history', default='history.snapshot', help="where to write the agent history store")
+    parser.add_argument('--search-results', default=SEARCH_RESULTS_PATH,
+                        help="search.py results whose forest params to train with, if present")
+    args = parser.parse_args()
+
+    if args.cprofile and not (args.profile or os.environ.get('TRAIN_PROFILE')):
+        # The cProfile dump is written next to the report, so it needs one
+        parser.error("--cprofile needs --profile <report.json> or TRAIN_PROFILE")
+    if args.profile or args.cprofile:
+        profiling.enable(args.profile, args.cprofile)
+
+    if args.memory_report:
+        report = memory_report(train_data_path)
+        print(f"{report['rows']} rows from {train_data_path}")
+        print(f"raw frame:        {report['raw_mb_before']:8.2f} MB -> {report['raw_mb_after']:8.2f} MB")
+        print(f"engineered frames: {report['engineered_mb_before']:7.2f} MB -> {report['engineered_mb_after']:8.2f} MB")
+        raise SystemExit(0)
+
+    if args.update_clusters:
+        # Fold a new month into the latest clustering instead of refitting on the full history
+        artifacts = load_artifacts()
+        performance_df, performance_features = prepare_data_for_clustering(args.update_clusters)
+        scaler, kmeans, performance_mapping, cluster_counts = update_cluster_model(
+            performance_df, performance_features, artifacts['scaler'], artifacts['kmeans'],
+            artifacts['cluster_counts'])
+        artifact_path = save_artifacts(artifacts['pipeline'], scaler, kmeans, performance_mapping,
+                                       cluster_counts=cluster_counts,
+                                       thresholds=artifacts.get('intervention_thresholds'))
+        print(f"Folded {len(performance_df)} rows into model version {artifacts['version']}; "
+              f"performance mapping {performance_mapping}")
+        print(f"Saved model artifacts to {artifact_path}")
+        profiling.write_report()
+        raise SystemExit(0)
+
+    # Keep the forest search.py picked, so a retrain doesn't revert to the defaults
+    forest_params = load_search_results(args.search_results)
+
     # Prepare data
     X_train, y_train, preprocessor = prepare_train_data(train_data_path)
-    model = train_model(X_train, y_train, preprocessor)
+    model = train_model(X_train, y_train, preprocessor, params=forest_params)
     
     performance_df, performance_features = prepare_data_for_clustering(train_data_path)
     scaler, kmeans, performance_mapping = train_cluster_model(performance_df, performance_features)
+    # Saved with the model so later batches can be scored against the training thresholds
+    thresholds = compute_intervention_thresholds(performance_df)
 
-    sales_predictions = predict_sales(test_data_path, model)
-    performance_predictions = predict_performance(test_data_path, scaler, kmeans, performance_mapping)
+    # Per-agent monthly history for the dashboard, from the cached training frame.
+    # Written before database.csv, so the backend reloads both together.
+    train_df, _, _ = build_features(train_data_path)
+    write_history(train_df, args.history)
 
-    # Merge predictions with performance data
-    test_data = pd.merge(sales_predictions, performance_predictions, on='agent_code', how='left')
+    # The training frames are no longer needed once the models are fitted
+    clear_feature_cache()
+
+    # Persist the fitted models so new months can be scored without retraining
+    artifact_path = save_artifacts(model, scaler, kmeans, performance_mapping, thresholds=thresholds)
+    print(f"Saved model artifacts to {artifact_path}")
+
+    # Score through the saved artifact so database.csv matches what score.py produces
+    test_data = score(test_data_path, load_artifacts(artifact_path))
     
     # Save the final predictions to a CSV file
-    test_data.to_csv('database.csv', index=False)
+    write_database(test_data, args.output)
 
-        
\ No newline at end of file
+    report_path = profiling.write_report()
+    if report_path:
+        print(f"Wrote stage report to {report_path}")